@@ -0,0 +1,354 @@
+"""
+PayShield Audio Executor
+Warm worker processes for CPU-bound audio work, fed through shared memory
+so the event loop never blocks on it
+"""
+
+import asyncio
+import atexit
+import io
+import multiprocessing
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from storage_metrics import LatencyHistogram
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# (output bytes or None, picklable metadata); see audio_preprocessing.prepare_upload
+Stage = Callable[..., Tuple[Optional[bytes], Any]]
+
+# Shared memory segments this worker has attached to, by name. Slots are
+# reused, so each worker maps each one once.
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when the executor's queue is full; the caller should retry later."""
+    pass
+
+
+def _silent_wav(rate: int, channels: int) -> bytes:
+    """100ms of silence as a WAV file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(bytes(rate // 10 * channels * 2))
+    return buffer.getvalue()
+
+
+def _warm_worker() -> None:
+    """Worker initializer: import numpy and build the resampling filters once"""
+    from audio_preprocessing import TARGET_RATE, prepare_upload
+
+    for rate, channels in ((48000, 2), (44100, 1), (TARGET_RATE, 1)):
+        prepare_upload(_silent_wav(rate, channels))
+
+
+def _execute(slot: str, size: int, stage: Stage, args: tuple) -> Tuple[float, float, int, Optional[bytes], Any]:
+    """
+    Run a stage on the input in a shared memory slot (in a worker)
+
+    The output is written back into the slot when it fits (it usually is
+    smaller than the input) and only returned through the result pipe
+    when it doesn't. Timestamps use time.monotonic(), which is
+    system-wide, so the parent can compare them with its own.
+    """
+    started = time.monotonic()
+    segment = _attached.get(slot)
+    if segment is None:
+        segment = _attached[slot] = shared_memory.SharedMemory(name=slot)
+    output, meta = stage(segment.buf[:size], *args)
+
+    output_size, overflow = -1, None
+    if output is not None:
+        if len(output) <= segment.size:
+            segment.buf[:len(output)] = output
+            output_size = len(output)
+        else:
+            overflow = output
+    return started, time.monotonic(), output_size, overflow, meta
+
+
+class AudioExecutor:
+    """
+    Process pool for CPU-bound audio stages
+
+    - Workers are started with "spawn" (forking a process that already runs
+      an event loop and helper threads is unsafe) and warmed up front, so
+      no request pays for imports or filter design.
+    - Input audio is copied once into a reusable shared memory slot and
+      workers map it; only the slot name crosses the pipe, not the audio.
+    - At most max_pending calls are queued or running; further calls fail
+      fast with ExecutorBusy instead of queueing without bound.
+    - Every call records per-stage timings: copy_in, queue_wait, compute,
+      result (worker finished -> caller resumed), copy_out and total.
+
+    All methods must be called from the event loop thread.
+    """
+
+    STAGES = ("copy_in", "queue_wait", "compute", "result", "copy_out", "total")
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 slot_bytes: Optional[int] = None):
+        """
+        Initialize the executor (processes start on first use or start())
+
+        Args:
+            workers: Worker processes; defaults to AUDIO_WORKERS or the CPU count (max 8)
+            max_pending: Queued plus running calls; defaults to AUDIO_MAX_PENDING or 4 per worker
+            slot_bytes: Largest input accepted; defaults to AUDIO_SLOT_BYTES or 8 MiB
+                        (~40s of 48kHz stereo PCM16)
+        """
+        self.workers = workers or int(os.getenv("AUDIO_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+        self.max_pending = max_pending or int(os.getenv("AUDIO_MAX_PENDING", "0")) or self.workers * 4
+        self.slot_bytes = slot_bytes or int(os.getenv("AUDIO_SLOT_BYTES", str(8 * 1024 * 1024)))
+        self.timings = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: List[shared_memory.SharedMemory] = []
+        self._free: List[shared_memory.SharedMemory] = []
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker
+        )
+
+    async def start(self) -> None:
+        """Start and warm every worker (otherwise done lazily by the first calls)"""
+        if self._pool is None:
+            self._pool = self._new_pool()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # One no-op per worker makes the pool spawn all of them now
+        await asyncio.gather(*(loop.run_in_executor(self._pool, time.sleep, 0.01) for _ in range(self.workers)))
+        logger.info("✅ Audio executor ready: %s warm workers in %.0fms", self.workers,
+                    (time.perf_counter() - started) * 1000)
+
+    def _acquire_slot(self) -> shared_memory.SharedMemory:
+        if self._free:
+            return self._free.pop()
+        slot = shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+        self._slots.append(slot)
+        return slot
+
+    def _release(self, slot: shared_memory.SharedMemory) -> None:
+        self._free.append(slot)
+        self.pending -= 1
+
+    async def run(self, stage: Stage, audio: bytes, *args: Any) -> Tuple[Optional[bytes], Any]:
+        """
+        Run a stage function in a worker process
+
+        Args:
+            stage: Module-level function taking (audio buffer, *args) and
+                   returning (output bytes or None, picklable metadata)
+            audio: Input audio
+            *args: Extra picklable arguments for the stage
+
+        Returns:
+            The stage's (output bytes or None, metadata)
+
+        Raises:
+            ExecutorBusy: max_pending calls are already queued or running
+            ValueError: audio is larger than slot_bytes
+        """
+        if len(audio) > self.slot_bytes:
+            raise ValueError(f"Audio is {len(audio)} bytes; the limit is {self.slot_bytes}")
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusy(f"Audio executor busy ({self.pending} calls pending)")
+        if self._pool is None:
+            self._pool = self._new_pool()
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        slot = self._acquire_slot()
+        future = None
+        try:
+            began = time.monotonic()
+            slot.buf[:len(audio)] = audio
+            submitted = time.monotonic()
+            future = self._pool.submit(_execute, slot.name, len(audio), stage, args)
+            started, finished, output_size, overflow, meta = await asyncio.wrap_future(future)
+            resumed = time.monotonic()
+
+            if overflow is not None:
+                output = overflow
+            else:
+                output = bytes(slot.buf[:output_size]) if output_size >= 0 else None
+            done = time.monotonic()
+
+            for name, seconds in (("copy_in", submitted - began), ("queue_wait", started - submitted),
+                                  ("compute", finished - started), ("result", resumed - finished),
+                                  ("copy_out", done - resumed), ("total", done - began)):
+                self.timings[name].observe(max(0.0, seconds))
+            self.completed += 1
+            return output, meta
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); later calls get a fresh pool
+            logger.error("❌ Audio worker died, restarting the pool")
+            self.failed += 1
+            self._pool = self._new_pool()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if future is not None and not future.done():
+                # Cancelled while a worker still reads the slot: reuse it only
+                # once the worker is done with it
+                future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, slot))
+            else:
+                self._release(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, counters and per-stage timings for health checks"""
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "shared_memory_slots": len(self._slots),
+            "stages": {name: histogram.stats() for name, histogram in self.timings.items()}
+        }
+
+    def shutdown(self) -> None:
+        """Stop the workers and free the shared memory"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._slots.clear()
+        self._free.clear()
+
+
+# Global instance for the verification pipeline
+audio_executor = AudioExecutor()
+atexit.register(audio_executor.shutdown)
+
+
+async def run_audio_stage(stage: Stage, audio: bytes, *args: Any) -> Tuple[Optional[bytes], Any]:
+    """
+    Convenience function: run a stage on the global executor
+
+    Args:
+        stage: Module-level stage function
+        audio: Input audio
+        *args: Extra picklable arguments for the stage
+
+    Returns:
+        The stage's (output bytes or None, metadata)
+    """
+    return await audio_executor.run(stage, audio, *args)
+
+
+if __name__ == "__main__":
+    # Load test: 200 concurrent verifications (preprocess, simulated 50ms
+    # transcription, transcript match), with the audio stage run inline on
+    # the event loop, in a thread, and in the process pool. A ticker
+    # measures how late the event loop gets to other work.
+    import statistics
+
+    import numpy as np
+
+    from audio_preprocessing import prepare_upload
+    from structured_logging import configure_logging
+    from transcript_matcher import match_transcript
+
+    configure_logging("WARNING")
+    CONCURRENCY = 200
+    rng = np.random.default_rng(0)
+
+    def recording(seconds_of_speech: float) -> bytes:
+        rate = 48000
+        t = np.arange(int(seconds_of_speech * rate)) / rate
+        speech = 0.2 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+        noise = lambda seconds: rng.normal(0, 0.003, int(seconds * rate))
+        mono = np.concatenate([noise(1.0), speech, noise(2.0)])
+        stereo = np.repeat((mono * 32767).astype("<i2")[:, None], 2, axis=1)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(2)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            out.writeframes(stereo.tobytes())
+        return buffer.getvalue()
+
+    audio = recording(3.0)
+
+    async def verify(mode: str, executor: Optional[AudioExecutor]) -> float:
+        started = time.perf_counter()
+        if mode == "inline":
+            prepare_upload(audio)
+        elif mode == "thread":
+            await asyncio.to_thread(prepare_upload, audio)
+        else:
+            await executor.run(prepare_upload, audio)
+        await asyncio.sleep(0.05)
+        match_transcript("check authority cut", "check authority cut")
+        return time.perf_counter() - started
+
+    async def load_test(mode: str, executor: Optional[AudioExecutor] = None) -> Dict[str, Any]:
+        lags: List[float] = []
+        stop = asyncio.Event()
+
+        async def ticker() -> None:
+            while not stop.is_set():
+                before = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - before - 0.005)
+
+        tick = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(verify(mode, executor) for _ in range(CONCURRENCY)),
+                                       return_exceptions=True)
+        wall = time.perf_counter() - started
+        stop.set()
+        await tick
+        latencies = sorted(r for r in results if isinstance(r, float))
+        return {
+            "ok": len(latencies),
+            "busy": sum(isinstance(r, ExecutorBusy) for r in results),
+            "wall_s": round(wall, 2),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000) if latencies else None,
+            "loop_lag_max_ms": round(max(lags) * 1000, 1),
+            "loop_lag_mean_ms": round(statistics.fmean(lags) * 1000, 2)
+        }
+
+    async def main() -> None:
+        print(f"{CONCURRENCY} concurrent verifications, {len(audio):,}-byte 48kHz stereo recording each")
+        print(f"inline on the loop: {await load_test('inline')}")
+        print(f"asyncio.to_thread:  {await load_test('thread')}")
+
+        executor = AudioExecutor(max_pending=CONCURRENCY)
+        await executor.start()
+        print(f"process pool:       {await load_test('pool', executor)}")
+        for stage, histogram in executor.timings.items():
+            print(f"  {stage:10s} {histogram.stats()}")
+        executor.shutdown()
+
+        bounded = AudioExecutor(max_pending=32)
+        await bounded.start()
+        print(f"max_pending=32:     {await load_test('pool', bounded)}")
+        bounded.shutdown()
+
+    asyncio.run(main())
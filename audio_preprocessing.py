@@ -0,0 +1,371 @@
+"""
+PayShield Audio Preprocessing
+Decode, downmix, resample and trim silence from recordings before they are
+uploaded for transcription
+"""
+
+import functools
+import io
+import struct
+import wave
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# What the transcription engines are fed: 16-bit PCM, mono, 16kHz
+TARGET_RATE = 16000
+
+# Voice activity detection works on 20ms frames. A frame is speech when its
+# energy is NOISE_RATIO (~8 dB) above the noise floor, the quietest 10% of
+# frames, and above MIN_ENERGY (-50 dBFS). Frames up to 6 dB quieter than
+# that still count when they cross zero often, which keeps unvoiced
+# consonants (s, f, th) at the edges of words. A recording with no pauses
+# has no noise to measure (its quietest frames are speech too), so frames
+# above SPEECH_ENERGY (-30 dBFS) are speech whatever the floor.
+FRAME_MS = 20
+NOISE_RATIO = 6.0
+MIN_ENERGY = 1e-5
+SPEECH_ENERGY = 1e-3
+ZCR_THRESHOLD = 0.25
+# Kept before the first and after the last speech frame, so onsets and
+# trailing sounds reach the engine intact
+PADDING_MS = 200
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+_SAMPLE_TYPES = {
+    (_WAVE_FORMAT_PCM, 8): np.dtype("u1"),
+    (_WAVE_FORMAT_PCM, 16): np.dtype("<i2"),
+    (_WAVE_FORMAT_PCM, 32): np.dtype("<i4"),
+    (_WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype("<f4"),
+}
+
+
+class AudioFormatError(ValueError):
+    """Raised when audio is not in a format this module can decode."""
+    pass
+
+
+@dataclass
+class PreprocessedAudio:
+    """Recording reduced to the span that contains speech"""
+    samples: np.ndarray
+    sample_rate: int
+    original_duration: float
+    speech_start: float
+    speech_end: float
+    has_speech: bool
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Samples of a WAV file without copying them
+
+    The RIFF chunks are walked directly so the sample array is a view of
+    data (wave.readframes would copy). Streamed files whose data chunk size
+    was never filled in (0 or 0xFFFFFFFF) are read to the end.
+
+    Args:
+        data: WAV file contents
+
+    Returns:
+        (frames, channels) array in the file's sample type, and the sample rate
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise AudioFormatError("Not a WAV file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            tag, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE:
+                tag = struct.unpack_from("<H", data, body + 24)[0]
+            fmt = (tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioFormatError("WAV data chunk before fmt chunk")
+            tag, channels, sample_rate, bits = fmt
+            dtype = _SAMPLE_TYPES.get((tag, bits))
+            if dtype is None or not channels:
+                raise AudioFormatError(f"Unsupported WAV format {tag} with {bits}-bit samples")
+            if size == 0 or size > len(data) - body:
+                size = len(data) - body
+            frames = size // (dtype.itemsize * channels)
+            samples = np.frombuffer(data, dtype=dtype, count=frames * channels, offset=body)
+            return samples.reshape(frames, channels), sample_rate
+        pos = body + size + (size & 1)
+    raise AudioFormatError("WAV file has no data chunk")
+
+
+def decode_pcm(data: bytes, channels: int = 1) -> np.ndarray:
+    """Raw 16-bit little-endian PCM (as streamed by the browser) as a (frames, channels) view"""
+    frames = len(data) // (2 * channels)
+    return np.frombuffer(data, dtype="<i2", count=frames * channels).reshape(frames, channels)
+
+
+def to_float(samples: np.ndarray) -> np.ndarray:
+    """Samples scaled to float32 in [-1, 1)"""
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128) / 128
+    if samples.dtype.kind == "i":
+        return samples.astype(np.float32) / float(-np.iinfo(samples.dtype).min)
+    return samples.astype(np.float32, copy=False)
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Mono float32 from (frames, channels) samples"""
+    if samples.shape[1] == 1:
+        return to_float(samples[:, 0])
+    return to_float(samples).mean(axis=1, dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=16)
+def _lowpass(ratio: float, taps: int = 63) -> np.ndarray:
+    """Hamming-windowed sinc anti-aliasing filter for downsampling by ratio"""
+    cutoff = 0.5 * ratio * 0.9
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int = TARGET_RATE) -> np.ndarray:
+    """
+    Resample mono float32 audio
+
+    Downsampling low-pass filters first. For whole-number ratios
+    (48k -> 16k) only the kept outputs are filtered: every nth window of a
+    strided view times the kernel, a third of the work of a full
+    convolution. Other ratios filter, then interpolate linearly.
+    """
+    if from_rate == to_rate or not len(samples):
+        return samples
+    if to_rate < from_rate:
+        kernel = _lowpass(to_rate / from_rate)
+        if from_rate % to_rate == 0:
+            half = len(kernel) // 2
+            windows = sliding_window_view(np.pad(samples, (half, half)), len(kernel))
+            # The kernel is symmetric, so no flip is needed
+            return windows[::from_rate // to_rate] @ kernel
+        samples = np.convolve(samples, kernel, mode="same")
+    count = int(len(samples) * to_rate / from_rate)
+    positions = np.arange(count) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    Speech flag per frame from frame energy and zero-crossing rate
+
+    Args:
+        samples: Mono int16 or float32 samples
+        sample_rate: Sample rate
+        frame_ms: Frame length
+
+    Returns:
+        Boolean array with one entry per whole frame
+    """
+    frame_length = sample_rate * frame_ms // 1000
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[:count * frame_length].reshape(count, frame_length)
+
+    # Mean square per frame, normalised to full scale = 1.0
+    energy = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / frame_length
+    if samples.dtype.kind == "i":
+        energy /= float(np.iinfo(samples.dtype).min) ** 2
+    signs = np.signbit(frames)
+    crossings = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+
+    noise_floor = np.percentile(energy, 10)
+    relative = max(MIN_ENERGY, noise_floor * NOISE_RATIO)
+    threshold = min(relative, max(MIN_ENERGY, SPEECH_ENERGY))
+    # Loud noise crosses zero often too, so the consonant rule stays relative
+    speech = (energy > threshold) | ((energy > relative / 4) & (crossings > ZCR_THRESHOLD))
+
+    # Drop isolated frames (clicks, pops): speech needs a speech neighbour
+    neighbour = np.zeros_like(speech)
+    neighbour[1:] |= speech[:-1]
+    neighbour[:-1] |= speech[1:]
+    return speech & neighbour
+
+
+def trim_silence(samples: np.ndarray, sample_rate: int,
+                 padding_ms: int = PADDING_MS) -> Tuple[int, int]:
+    """
+    Sample range from just before the first to just after the last speech
+
+    Pauses between words are kept; only the leading and trailing silence
+    is removed. Returns (0, 0) when there is no speech.
+    """
+    speech = np.flatnonzero(detect_speech(samples, sample_rate))
+    if not speech.size:
+        return 0, 0
+    frame_length = sample_rate * FRAME_MS // 1000
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, int(speech[0]) * frame_length - padding)
+    end = min(len(samples), (int(speech[-1]) + 1) * frame_length + padding)
+    return start, end
+
+
+def to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """float32 samples as int16 (int16 input is returned as is)"""
+    if samples.dtype == np.int16:
+        return samples
+    return (np.clip(samples, -1.0, 32767 / 32768) * 32768).astype(np.int16)
+
+
+def preprocess_audio(data: bytes, sample_rate: Optional[int] = None, channels: int = 1) -> PreprocessedAudio:
+    """
+    Reduce a recording to 16kHz mono PCM16 containing only the speech
+
+    16kHz mono 16-bit input is never converted: detection and trimming work
+    on a view of data and the result is a slice of it.
+
+    Args:
+        data: WAV file, or raw PCM16 when sample_rate is given
+        sample_rate: Sample rate of raw PCM input
+        channels: Channel count of raw PCM input
+
+    Returns:
+        PreprocessedAudio (empty samples when no speech was found)
+
+    Raises:
+        AudioFormatError: data is neither WAV nor raw PCM (e.g. webm/ogg)
+    """
+    if data[:4] == b"RIFF":
+        samples, rate = decode_wav(data)
+    elif sample_rate is not None:
+        samples, rate = decode_pcm(data, channels), sample_rate
+    else:
+        raise AudioFormatError("Unrecognised audio format; expected WAV or raw PCM16")
+    original_duration = len(samples) / rate
+
+    if rate == TARGET_RATE and samples.shape[1] == 1 and samples.dtype == np.int16:
+        mono = samples[:, 0]
+    else:
+        mono = resample(downmix(samples), rate)
+
+    start, end = trim_silence(mono, TARGET_RATE)
+    return PreprocessedAudio(
+        samples=to_pcm16(mono[start:end]),
+        sample_rate=TARGET_RATE,
+        original_duration=original_duration,
+        speech_start=start / TARGET_RATE,
+        speech_end=end / TARGET_RATE,
+        has_speech=end > start
+    )
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = TARGET_RATE) -> bytes:
+    """Mono PCM16 samples as a WAV file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(samples.astype("<i2", copy=False).tobytes())
+    return buffer.getvalue()
+
+
+def prepare_upload(data: bytes) -> Tuple[Optional[bytes], Dict[str, Any]]:
+    """
+    Preprocess a recording into the WAV file sent for transcription
+
+    Shaped as an AudioExecutor stage: (output bytes, picklable metadata).
+
+    Returns:
+        WAV bytes (None when there is no speech) and the durations in seconds
+
+    Raises:
+        AudioFormatError: data is neither WAV nor raw PCM (e.g. webm/ogg)
+    """
+    audio = preprocess_audio(data)
+    info = {
+        "original_duration": audio.original_duration,
+        "duration": audio.duration,
+        "speech_start": audio.speech_start,
+        "speech_end": audio.speech_end
+    }
+    return (encode_wav(audio.samples, audio.sample_rate) if audio.has_speech else None), info
+
+
+if __name__ == "__main__":
+    # Benchmark on synthetic recordings: 1.5s of room noise, ~3s of
+    # speech-like bursts (voiced harmonics plus a fricative), 3s of noise
+    import time
+
+    rng = np.random.default_rng(0)
+
+    def synthetic_recording(rate: int, channels: int) -> bytes:
+        def noise(seconds: float) -> np.ndarray:
+            return rng.normal(0, 0.003, int(seconds * rate))
+
+        t = np.arange(int(0.35 * rate)) / rate
+        envelope = np.sin(np.pi * t / t[-1]) ** 2
+        voiced = sum(np.sin(2 * np.pi * f * t) / k for k, f in enumerate((140, 280, 420, 560), 1))
+        word = 0.2 * envelope * voiced
+        fricative = 0.05 * rng.normal(0, 1, int(0.12 * rate))
+        pause = noise(0.25)
+        speech = np.concatenate([word, pause, fricative, word, pause, word, pause, word, fricative, pause, word])
+        mono = np.concatenate([noise(1.5), speech + rng.normal(0, 0.003, len(speech)), noise(3.0)])
+        pcm = (np.clip(mono, -1, 1) * 32767).astype("<i2")
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(channels)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            out.writeframes(np.repeat(pcm[:, None], channels, axis=1).tobytes())
+        return buffer.getvalue()
+
+    for rate, channels in ((48000, 2), (44100, 1), (16000, 1)):
+        data = synthetic_recording(rate, channels)
+        audio = preprocess_audio(data)
+        runs = 50
+        started = time.perf_counter()
+        for _ in range(runs):
+            preprocess_audio(data)
+        elapsed_ms = (time.perf_counter() - started) / runs * 1000
+        upload = encode_wav(audio.samples)
+        print(f"{rate}Hz x{channels}: {audio.original_duration:.2f}s -> speech {audio.speech_start:.2f}s-"
+              f"{audio.speech_end:.2f}s ({audio.duration:.2f}s), {len(data):,} -> {len(upload):,} bytes "
+              f"({len(upload) / len(data):.0%}), {elapsed_ms / audio.original_duration:.2f}ms per second of audio")
+
+    silence = encode_wav((rng.normal(0, 0.003, TARGET_RATE * 3) * 32767).astype(np.int16))
+    print(f"Room noise only: has_speech={preprocess_audio(silence).has_speech}")
+
+    def harmonics(seconds: float, f0: float) -> np.ndarray:
+        t = np.arange(int(seconds * TARGET_RATE)) / TARGET_RATE
+        return sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 5))
+
+    def pcm16(mono: np.ndarray) -> bytes:
+        return encode_wav((np.clip(mono, -1, 1) * 32767).astype(np.int16))
+
+    # No pauses at all: four 0.6s voiced segments at equal loudness, so the
+    # quietest frames are speech rather than noise
+    continuous = np.concatenate([0.2 * harmonics(0.6, f0) for f0 in (120, 150, 180, 210)])
+    audio = preprocess_audio(pcm16(continuous + rng.normal(0, 0.003, len(continuous))))
+    assert audio.has_speech and audio.duration > 2.3, audio
+    print(f"Silence-free speech: has_speech={audio.has_speech}, kept {audio.duration:.2f}s of 2.40s")
+
+    # First word ~26 dB quieter than the rest, only a few dB above the room
+    # noise; it must survive trimming (onset at 1.50s)
+    t = np.arange(int(0.35 * TARGET_RATE)) / TARGET_RATE
+    envelope = np.sin(np.pi * t / t[-1]) ** 2
+    word = envelope * harmonics(0.35, 140)
+    pause = rng.normal(0, 0.003, TARGET_RATE // 4)
+    quiet_first = np.concatenate([rng.normal(0, 0.003, TARGET_RATE * 3 // 2), 0.01 * word, pause,
+                                  0.2 * word, pause, 0.2 * word, rng.normal(0, 0.003, TARGET_RATE * 2)])
+    audio = preprocess_audio(pcm16(quiet_first))
+    assert audio.speech_start <= 1.5, audio.speech_start
+    print(f"Quiet first word: speech starts {audio.speech_start:.2f}s (word onset 1.50s)")
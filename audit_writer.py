@@ -0,0 +1,391 @@
+"""
+PayShield Audit Writer
+Write-behind buffer that flushes verification attempts in batches, and
+aggregation of verification-count increments
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class AuditLogWriter:
+    """
+    Buffers audit records and hands them to a flush callback in batches
+
+    A batch is flushed when it reaches max_batch_size or when its oldest
+    record has waited max_delay seconds, whichever comes first. Failed
+    batches are retried; if the backlog grows past max_pending the oldest
+    records are dropped (and counted) rather than exhausting memory.
+
+    A batch failing with one of permanent_errors would fail on every retry, so
+    it is bisected until the offending records are isolated; those go to the
+    dead_letter callback and the rest of the batch is written.
+    """
+
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[None]],
+                 max_batch_size: int = 200, max_delay: float = 0.05,
+                 max_pending: int = 50000, retry_delay: float = 1.0,
+                 permanent_errors: Tuple[Type[BaseException], ...] = (),
+                 dead_letter: Optional[Callable[[List[Any], Exception], Awaitable[None]]] = None,
+                 close_timeout: float = 5.0):
+        """
+        Initialize the writer
+
+        Args:
+            flush: Coroutine function that persists one batch
+            max_batch_size: Records per flush
+            max_delay: Longest time (seconds) a record may sit in the buffer;
+                0 makes every write synchronous
+            max_pending: Backlog limit while the backing store is failing
+            retry_delay: Pause before retrying a failed flush
+            permanent_errors: Errors meaning the store rejected the data itself
+                (retrying the same records can never succeed)
+            dead_letter: Coroutine function receiving records that could not
+                be written, with the error; without one they are only logged
+            close_timeout: How long close() keeps retrying a failing store
+                before dead-lettering what is left
+        """
+        self._flush = flush
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.permanent_errors = permanent_errors
+        self.close_timeout = close_timeout
+        self._dead_letter = dead_letter
+
+        self._buffer: List[Any] = []
+        self._oldest_at = 0.0
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.stats: Dict[str, int] = {
+            "enqueued": 0, "flushed": 0, "batches": 0, "failed_flushes": 0, "dropped": 0,
+            "rejected": 0
+        }
+
+    def start(self) -> None:
+        """Start the background flush loop"""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, record: Any) -> None:
+        """Buffer a record (flushes inline when max_delay is 0)"""
+        if not self._buffer:
+            self._oldest_at = time.monotonic()
+        self._buffer.append(record)
+        self.stats["enqueued"] += 1
+
+        if self.max_delay <= 0 or self._closing:
+            await self.flush()
+            return
+
+        self.start()
+        self._has_items.set()
+        if len(self._buffer) >= self.max_batch_size:
+            self._batch_full.set()
+
+    async def flush(self) -> None:
+        """Flush everything buffered so far; raises if a batch fails"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.max_batch_size]
+                del self._buffer[:len(batch)]
+                # Stack of unwritten parts, next one last
+                parts = [batch]
+                while parts:
+                    part = parts.pop()
+                    try:
+                        await self._flush(part)
+                    except self.permanent_errors as e:
+                        if len(part) > 1:
+                            middle = len(part) // 2
+                            parts += [part[middle:], part[:middle]]
+                        else:
+                            await self._reject(part, e)
+                        continue
+                    except Exception:
+                        self.stats["failed_flushes"] += 1
+                        self._requeue(part + [record for rest in reversed(parts) for record in rest])
+                        raise
+                    self.stats["flushed"] += len(part)
+                    self.stats["batches"] += 1
+            self._has_items.clear()
+
+    async def close(self) -> None:
+        """
+        Stop the flush loop and flush whatever is still buffered
+
+        A failing store is retried for up to close_timeout seconds; records
+        still unwritten after that are dead-lettered instead of discarded.
+        """
+        self._closing = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        deadline = time.monotonic() + self.close_timeout
+        while True:
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                if time.monotonic() + self.retry_delay >= deadline:
+                    logger.error("❌ Final audit flush failed for %s records: %s", len(self._buffer), e)
+                    records, self._buffer = self._buffer, []
+                    await self._reject(records, e)
+                    return
+                await asyncio.sleep(self.retry_delay)
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered records"""
+        return len(self._buffer)
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_items.wait()
+
+            # Wait for a full batch, but never past the oldest record's deadline
+            remaining = self._oldest_at + self.max_delay - time.monotonic()
+            if len(self._buffer) < self.max_batch_size and remaining > 0:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("❌ Audit flush failed, retrying in %ss: %s", self.retry_delay, e)
+                await asyncio.sleep(self.retry_delay)
+
+    async def _reject(self, records: List[Any], error: Exception) -> None:
+        self.stats["rejected"] += len(records)
+        if self._dead_letter is None:
+            logger.error("❌ %s audit records could not be written and were dropped: %s", len(records), error)
+            return
+        try:
+            await self._dead_letter(records, error)
+            logger.warning("⚠️ %s audit records dead-lettered: %s", len(records), error)
+        except Exception as e:
+            logger.error("❌ Dead-lettering %s audit records failed, records lost: %s", len(records), e)
+
+    def _requeue(self, batch: List[Any]) -> None:
+        self._buffer[:0] = batch
+        self._oldest_at = time.monotonic()
+        overflow = len(self._buffer) - self.max_pending
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.stats["dropped"] += overflow
+            logger.error("❌ Audit backlog full, dropped %s oldest records", overflow)
+
+
+class CounterAggregator:
+    """
+    Per-worker aggregation of counter increments
+
+    Increments are summed in memory and periodically folded into the backing
+    store with one update per key, so hot rows aren't locked once per event.
+    pending() and latest() include increments that are still being folded,
+    so reads can combine them with the stored values and stay accurate.
+    """
+
+    def __init__(self, fold: Callable[[Dict[str, int], Dict[str, Any]], Awaitable[None]],
+                 interval: float = 1.0):
+        """
+        Initialize the aggregator
+
+        Args:
+            fold: Coroutine function applying {key: delta} to the backing store,
+                with {key: latest event time} for keys whose increments had one
+            interval: Seconds between folds
+        """
+        self._fold = fold
+        self.interval = interval
+        self._pending: Dict[str, int] = {}
+        self._latest: Dict[str, Any] = {}
+        self._folding: Dict[str, int] = {}
+        self._folding_latest: Dict[str, Any] = {}
+        self._fold_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"increments": 0, "folds": 0, "failed_folds": 0}
+
+    def start(self) -> None:
+        """Start the background fold loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, key: str, delta: int = 1, at: Any = None) -> None:
+        """Record an increment, optionally with the time of the event it counts"""
+        self._pending[key] = self._pending.get(key, 0) + delta
+        self.stats["increments"] += delta
+        if at is not None:
+            _keep_latest(self._latest, key, at)
+
+    def pending(self, key: str) -> int:
+        """Delta not yet visible in the backing store"""
+        return self._pending.get(key, 0) + self._folding.get(key, 0)
+
+    def latest(self, key: str) -> Any:
+        """Latest event time not yet visible in the backing store, or None"""
+        times = [t for t in (self._latest.get(key), self._folding_latest.get(key)) if t is not None]
+        return max(times, default=None)
+
+    async def fold(self) -> None:
+        """Apply all pending deltas now; raises if the backing store fails"""
+        async with self._fold_lock:
+            if not self._pending:
+                return
+            self._folding, self._pending = self._pending, {}
+            self._folding_latest, self._latest = self._latest, {}
+            try:
+                await self._fold(self._folding, self._folding_latest)
+            except Exception:
+                self.stats["failed_folds"] += 1
+                for key, delta in self._folding.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+                for key, at in self._folding_latest.items():
+                    _keep_latest(self._latest, key, at)
+                raise
+            finally:
+                self._folding = {}
+                self._folding_latest = {}
+            self.stats["folds"] += 1
+
+    async def close(self) -> None:
+        """Stop the fold loop and apply whatever is still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.fold()
+        except Exception as e:
+            logger.error("❌ Final counter fold failed, %s keys lost: %s", len(self._pending), e)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.fold()
+            except Exception as e:
+                logger.error("❌ Counter fold failed, will retry: %s", e)
+
+
+def _keep_latest(times: Dict[str, Any], key: str, at: Any) -> None:
+    current = times.get(key)
+    if current is None or at > current:
+        times[key] = at
+
+
+if __name__ == "__main__":
+    # Test the audit writer
+    async def test_writer():
+        batches: List[List[int]] = []
+        failures = 1
+
+        async def flush(batch):
+            nonlocal failures
+            if failures:
+                failures -= 1
+                raise ConnectionError("postgres down")
+            batches.append(batch)
+
+        writer = AuditLogWriter(flush, max_batch_size=100, max_delay=0.02, retry_delay=0.01)
+        for i in range(1050):
+            await writer.write(i)
+        await asyncio.sleep(0.1)
+        await writer.write(1050)
+        await writer.close()
+
+        flushed = [record for batch in batches for record in batch]
+        assert sorted(flushed) == list(range(1051)), len(flushed)
+        print(f"{len(flushed)} records in {len(batches)} batches, stats: {writer.stats}")
+
+    asyncio.run(test_writer())
+
+    async def test_rejected_records():
+        written: List[int] = []
+        dead: List[int] = []
+        calls = 0
+
+        async def flush(batch):
+            nonlocal calls
+            calls += 1
+            if any(record < 0 for record in batch):
+                raise ValueError("invalid input for query argument")
+            written.extend(batch)
+
+        async def dead_letter(records, error):
+            dead.extend(records)
+
+        writer = AuditLogWriter(flush, max_batch_size=200, max_delay=0.01,
+                                permanent_errors=(ValueError,), dead_letter=dead_letter)
+        bad = {37, 512, 513}
+        for i in range(1000):
+            await writer.write(-i if i in bad else i)
+        await writer.close()
+
+        assert sorted(written) == [i for i in range(1000) if i not in bad], len(written)
+        assert sorted(dead) == sorted(-i for i in bad), dead
+        print(f"{len(dead)} bad records isolated in {calls} flush calls, {len(written)} written")
+
+        # A store that stays down through close() dead-letters instead of losing records
+        async def down(batch):
+            raise ConnectionError("postgres down")
+
+        dead.clear()
+        writer = AuditLogWriter(down, max_delay=60, retry_delay=0.01, close_timeout=0.05,
+                                dead_letter=dead_letter)
+        for i in range(300):
+            await writer.write(i)
+        await writer.close()
+        assert sorted(dead) == list(range(300)), len(dead)
+        print(f"Store down at close: {len(dead)} records dead-lettered, stats: {writer.stats}")
+
+    asyncio.run(test_rejected_records())
+
+    async def test_aggregator():
+        stored: Dict[str, int] = {}
+        stored_latest: Dict[str, int] = {}
+        statements = 0
+
+        async def fold(deltas, latest):
+            nonlocal statements
+            statements += len(deltas)
+            for key, delta in deltas.items():
+                stored[key] = stored.get(key, 0) + delta
+            for key, at in latest.items():
+                _keep_latest(stored_latest, key, at)
+
+        aggregator = CounterAggregator(fold, interval=0.01)
+        aggregator.start()
+        for i in range(10000):
+            # Event times arrive slightly out of order, as concurrent requests do
+            aggregator.add("hot@vendor.com", at=i - i % 3)
+            assert stored.get("hot@vendor.com", 0) + aggregator.pending("hot@vendor.com") == i + 1
+            if i % 1000 == 0:
+                await asyncio.sleep(0.02)
+        await aggregator.close()
+        assert stored["hot@vendor.com"] == 10000
+        assert stored_latest["hot@vendor.com"] == 9999 - 9999 % 3, stored_latest
+        print(f"10000 increments applied with {statements} row updates")
+
+    asyncio.run(test_aggregator())
@@ -3,15 +3,19 @@ PayShield Challenge Generator
 Single source of truth for all challenge phrases
 """
 
+import base64
 import json
 import secrets
 import os
-import logging
-from typing import List, Dict, Any
-from pathlib import Path
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from compiled_wordlist import CompiledWordlist, load_wordlist
+from entropy_buffer import EntropyBuffer
+from phonetic_index import PhoneticIndex
+from structured_logging import get_logger, configure_logging
+
+logger = get_logger(__name__)
 
 class ChallengeGenerator:
     """Generates secure challenge phrases using Diceware wordlist"""
@@ -24,27 +28,41 @@ class ChallengeGenerator:
             wordlist_path: Path to the Diceware wordlist file
         """
         self.wordlist_path = wordlist_path
-        self._wordlist: List[str] = []
-        self._load_wordlist()
+        # Wordlist and its phonetic index, replaced together by one
+        # assignment on reload so readers never need a lock
+        self._state: Optional[Tuple[CompiledWordlist, PhoneticIndex]] = None
+        # Word indices come from pre-drawn CSPRNG blocks instead of one
+        # os.urandom() call per word
+        self._entropy = EntropyBuffer()
+        # Loaded on first use, so importing this module touches no files
+    
+    def _loaded(self) -> Tuple[CompiledWordlist, PhoneticIndex]:
+        """Wordlist and phonetic index, loading them on first use"""
+        return self._state or self._load_wordlist()
     
-    def _load_wordlist(self) -> None:
-        """Load the 2048-word Diceware list from file"""
+    def _load_wordlist(self) -> Tuple[CompiledWordlist, PhoneticIndex]:
+        """Map the compiled Diceware list (compiling it if the text or rules changed)"""
         try:
-            wordlist_file = Path(self.wordlist_path)
-            if not wordlist_file.exists():
-                logger.error(f"Diceware wordlist not found at {self.wordlist_path}")
-                raise FileNotFoundError(f"Diceware wordlist not found at {self.wordlist_path}")
-            
-            with open(wordlist_file, 'r', encoding='utf-8') as f:
-                self._wordlist = [line.strip() for line in f if line.strip()]
-            
-            logger.info(f"Loaded {len(self._wordlist)} words from Diceware wordlist")
+            wordlist = load_wordlist(self.wordlist_path)
+            # Confusable pairs are stored in the compiled file, so nothing is
+            # recomputed here; the old state stays valid for in-flight callers
+            phonetic = PhoneticIndex.from_neighbours(wordlist, wordlist.neighbours)
+            state = self._state = (wordlist, phonetic)
             
-            if len(self._wordlist) != 2048:
-                logger.warning(f"Expected 2048 words, but loaded {len(self._wordlist)} words")
+            # Phrases never pair confusable words; report what that costs
+            report = phonetic.entropy_report(3, samples=0)
+            logger.info(
+                "Loaded %s words from Diceware wordlist (%s confusable pairs excluded, "
+                ">= %.1f bits per 3-word phrase, %.1f unconstrained)",
+                len(wordlist), report["confusable_pairs"], report["min_bits"], report["unconstrained_bits"]
+            )
+            return state
                 
+        except FileNotFoundError:
+            logger.error("Diceware wordlist not found at %s", self.wordlist_path)
+            raise
         except Exception as e:
-            logger.error(f"Failed to load wordlist: {e}")
+            logger.error("Failed to load wordlist: %s", e)
             raise
     
     def generate_challenge(self, word_count: int = 3) -> Dict[str, Any]:
@@ -55,21 +73,55 @@ class ChallengeGenerator:
             word_count: Number of words in the challenge (3 or 6)
             
         Returns:
-            Dictionary with the challenge phrase
+            Dictionary with the challenge id and phrase
         """
         if word_count not in [3, 6]:
-            logger.warning(f"Unusual word count requested: {word_count}. Recommended: 3 or 6")
+            logger.warning("Unusual word count requested: %s. Recommended: 3 or 6", word_count)
         
-        if not self._wordlist:
-            raise RuntimeError("Wordlist not loaded. Cannot generate challenge.")
+        # Same draw as generate_challenges without the batching around it;
+        # 16 id bytes are cheaper from secrets than through the buffer's lock
+        wordlist, phonetic = self._loaded()
+        phrase = phonetic.select(partial(self._entropy.indices, bound=len(wordlist)), 1, word_count)[0]
+        return {
+            "challenge_id": secrets.token_urlsafe(16),
+            "phrase": " ".join([wordlist[j] for j in phrase])
+        }
+    
+    def generate_challenges(self, n: int, word_count: int = 3) -> List[Dict[str, Any]]:
+        """
+        Generate several challenge phrases from one entropy draw
         
-        # Use secrets.choice for cryptographically secure random selection
-        selected_words = [secrets.choice(self._wordlist) for _ in range(word_count)]
-        phrase = " ".join(selected_words)
+        Args:
+            n: Number of challenges
+            word_count: Number of words per challenge (3 or 6)
+            
+        Returns:
+            List of dictionaries with the challenge ids and phrases
+            
+        Raises:
+            ValueError: word_count is too large for the wordlist
+        """
+        if word_count not in [3, 6]:
+            logger.warning("Unusual word count requested: %s. Recommended: 3 or 6", word_count)
+        
+        wordlist, phonetic = self._loaded()
         
-        logger.info(f"Generated {word_count}-word challenge phrase")
+        # Uniform, unbiased indices from the CSPRNG buffer (rejection sampling),
+        # skipping words that repeat or sound like one already in the phrase
+        phrases = phonetic.select(lambda count: self._entropy.indices(count, len(wordlist)), n, word_count)
+        # 128-bit ids, so the issuance store can key on them without collisions
+        id_bytes = self._entropy.token_bytes(n * 16)
+        challenges = [
+            {
+                "challenge_id": base64.urlsafe_b64encode(id_bytes[i * 16:(i + 1) * 16]).rstrip(b"=").decode(),
+                "phrase": " ".join([wordlist[j] for j in phrase])
+            }
+            for i, phrase in enumerate(phrases)
+        ]
         
-        return {"phrase": phrase}
+        logger.debug("Generated %s %s-word challenge phrases", n, word_count)
+        
+        return challenges
     
     def generate_challenge_json(self, word_count: int = 3) -> str:
         """
@@ -85,14 +137,23 @@ class ChallengeGenerator:
         return json.dumps(challenge)
     
     def reload_wordlist(self) -> None:
-        """Reload the wordlist from file (useful for updates)"""
+        """
+        Reload the wordlist from file (useful for updates)
+        
+        Recompiles if the text file or the phonetic rules changed and maps
+        the new file; calls already running finish on the previous wordlist.
+        """
         logger.info("Reloading Diceware wordlist")
         self._load_wordlist()
     
+    def entropy_report(self, word_count: int = 3) -> Dict[str, Any]:
+        """Bits per phrase under the phonetic-distinctness constraint"""
+        return self._loaded()[1].entropy_report(word_count)
+    
     @property
     def wordlist_size(self) -> int:
         """Get the current wordlist size"""
-        return len(self._wordlist)
+        return len(self._loaded()[0])
 
 
 # Global instance for use by FastAPI routes
@@ -107,11 +168,25 @@ def get_challenge(word_count: int = 3) -> Dict[str, Any]:
         word_count: Number of words in the challenge (3 or 6)
         
     Returns:
-        Dictionary with the challenge phrase
+        Dictionary with the challenge id and phrase
     """
     return challenge_generator.generate_challenge(word_count)
 
 
+def get_challenges(n: int, word_count: int = 3) -> List[Dict[str, Any]]:
+    """
+    Convenience function for bulk issuance
+    
+    Args:
+        n: Number of challenges
+        word_count: Number of words per challenge (3 or 6)
+        
+    Returns:
+        List of dictionaries with the challenge ids and phrases
+    """
+    return challenge_generator.generate_challenges(n, word_count)
+
+
 def get_challenge_json(word_count: int = 3) -> str:
     """
     Convenience function for FastAPI route usage (JSON response)
@@ -127,6 +202,7 @@ def get_challenge_json(word_count: int = 3) -> str:
 
 if __name__ == "__main__":
     # Test the challenge generator
+    configure_logging()
     generator = ChallengeGenerator()
     
     print("Testing 3-word challenge:")
@@ -135,4 +211,37 @@ if __name__ == "__main__":
     print("\nTesting 6-word challenge:")
     print(generator.generate_challenge_json(6))
     
-    print(f"\nWordlist contains {generator.wordlist_size} words")
\ No newline at end of file
+    print(f"\nWordlist contains {generator.wordlist_size} words")
+    for word_count in (3, 6):
+        print(f"Entropy report: {generator.entropy_report(word_count)}")
+    
+    # Benchmark: the same phrases and ids with one secrets call per word
+    # (os.urandom each time) instead of the buffer
+    import time
+    
+    N = 100000
+    wordlist, phonetic = generator._loaded()
+    
+    def per_challenge(fn, count: int) -> float:
+        started = time.perf_counter()
+        fn()
+        return (time.perf_counter() - started) / count * 1e6
+    
+    def secrets_indices(count: int) -> List[int]:
+        return [secrets.randbelow(len(wordlist)) for _ in range(count)]
+    
+    for word_count in (3, 6):
+        baseline = per_challenge(
+            lambda: [
+                {
+                    "challenge_id": secrets.token_urlsafe(16),
+                    "phrase": " ".join([wordlist[j] for j in phonetic.select(secrets_indices, 1, word_count)[0]])
+                }
+                for _ in range(N)
+            ], N
+        )
+        single = per_challenge(lambda: [generator.generate_challenge(word_count) for _ in range(N)], N)
+        bulk = per_challenge(lambda: generator.generate_challenges(N, word_count), N)
+        print(f"{word_count} words: secrets {baseline:.2f}µs, generate_challenge {single:.2f}µs "
+              f"({baseline / single:.1f}x), generate_challenges {bulk:.2f}µs ({baseline / bulk:.1f}x)")
+    print(f"Entropy buffer: {generator._entropy.stats()}")
\ No newline at end of file
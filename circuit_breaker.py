@@ -0,0 +1,182 @@
+"""
+PayShield Circuit Breaker
+Automatic failover and recovery for optional backends such as Redis
+"""
+
+import random
+import time
+from typing import Any, Dict
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker with exponential backoff
+
+    - closed: requests flow; consecutive failures are counted
+    - open: requests are short-circuited until the backoff elapses
+    - half_open: a single probe request is let through; success closes the
+      circuit, failure re-opens it with a doubled backoff
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            name: Backend name used in logs and metrics
+            failure_threshold: Consecutive failures that open a closed circuit
+            base_backoff: Seconds to stay open after the first trip
+            max_backoff: Upper bound for the exponential backoff
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.state = self.CLOSED
+        self.backoff = base_backoff
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._state_since = time.monotonic()
+
+        self.transitions: Dict[str, int] = {}
+        self.failures = 0
+        self.short_circuited = 0
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent to the backend right now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() < self._open_until:
+                self.short_circuited += 1
+                return False
+            self._transition(self.HALF_OPEN)
+
+        # Half-open: exactly one probe at a time
+        if self._probe_in_flight:
+            self.short_circuited += 1
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        """Report a successful backend call"""
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != self.CLOSED:
+            self.backoff = self.base_backoff
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Report a failed backend call"""
+        self.failures += 1
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open()
+        elif self.state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        """Report a call that ended without a verdict (e.g. cancelled)"""
+        self._probe_in_flight = False
+
+    def trip(self) -> None:
+        """Open the circuit immediately (e.g. the backend failed at startup)"""
+        if self.state != self.OPEN:
+            self._open()
+
+    @property
+    def is_available(self) -> bool:
+        """False while the circuit is open and waiting out its backoff"""
+        return self.state != self.OPEN
+
+    def stats(self) -> Dict[str, Any]:
+        """State-transition metrics for health checks"""
+        return {
+            "state": self.state,
+            "seconds_in_state": round(time.monotonic() - self._state_since, 3),
+            "backoff_seconds": self.backoff,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "transitions": dict(self.transitions)
+        }
+
+    def _open(self) -> None:
+        # Jitter keeps a fleet of workers from probing in lockstep
+        self._open_until = time.monotonic() + self.backoff * random.uniform(0.8, 1.2)
+        self._transition(self.OPEN)
+
+    def _transition(self, new_state: str) -> None:
+        if new_state == self.state:
+            return
+        key = f"{self.state}->{new_state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning("Circuit '%s' %s (backoff %gs)", self.name, key, self.backoff)
+        self.state = new_state
+        self._state_since = time.monotonic()
+
+
+if __name__ == "__main__":
+    # Fault-injection test: backend goes down, stays down for a while, comes back
+    import asyncio
+
+    class FlakyBackend:
+        def __init__(self):
+            self.up = True
+
+        async def call(self):
+            if not self.up:
+                raise ConnectionError("backend down")
+            return "PONG"
+
+    async def test_breaker():
+        backend = FlakyBackend()
+        breaker = CircuitBreaker("test", failure_threshold=3, base_backoff=0.05, max_backoff=0.4)
+
+        async def request():
+            if not breaker.allow_request():
+                return "fallback"
+            try:
+                result = await backend.call()
+            except ConnectionError:
+                breaker.record_failure()
+                return "fallback"
+            breaker.record_success()
+            return result
+
+        assert await request() == "PONG"
+
+        backend.up = False
+        for _ in range(10):
+            await request()
+        assert breaker.state == CircuitBreaker.OPEN
+        print(f"After outage: {breaker.state}, short-circuited {breaker.short_circuited} calls")
+
+        # Failed probes double the backoff
+        for _ in range(4):
+            await asyncio.sleep(breaker.backoff * 1.3)
+            await request()
+        print(f"Backoff after failed probes: {breaker.backoff}s")
+
+        backend.up = True
+        await asyncio.sleep(breaker.backoff * 1.3)
+        assert await request() == "PONG"
+        assert breaker.state == CircuitBreaker.CLOSED
+        print(f"Recovered: {breaker.stats()}")
+
+    asyncio.run(test_breaker())
@@ -0,0 +1,146 @@
+"""
+PayShield Cleanup Engine
+Deletes expired rows in small batches so retention never holds long locks
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import asyncpg
+
+from storage_statements import statement
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CleanupJob:
+    """
+    One table's retention rule
+
+    delete_statement must take the job's args followed by a batch size,
+    delete at most that many rows (skipping rows locked by others) and
+    return one row per deleted row.
+    """
+    name: str
+    lock_statement: str
+    delete_statement: str
+    args: Callable[[], tuple] = tuple
+    on_batch: Optional[Callable[[List[Any]], Awaitable[None]]] = None
+
+
+class CleanupEngine:
+    """
+    Runs cleanup jobs as a loop of short transactions
+
+    Each batch sets a lock timeout, takes the table lock (the wait is
+    measured separately), deletes up to batch_size rows and commits, then
+    sleeps for pause seconds so foreground traffic gets the table back. A
+    batch that can't get its lock in time is retried after a backoff, and
+    the run stops after max_lock_timeouts of them.
+    """
+
+    def __init__(self, batch_size: int = 1000, pause: float = 0.05,
+                 lock_timeout: float = 2.0, max_lock_timeouts: int = 3):
+        """
+        Initialize the engine
+
+        Args:
+            batch_size: Rows deleted per transaction
+            pause: Seconds to sleep between batches
+            lock_timeout: Longest wait for the table lock per batch
+            max_lock_timeouts: Lock timeouts tolerated before a run gives up
+        """
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+        self.max_lock_timeouts = max_lock_timeouts
+
+    async def run(self, pool, job: CleanupJob) -> Dict[str, Any]:
+        """
+        Delete everything the job matches, one batch at a time
+
+        Args:
+            pool: PostgreSQL pool (any backend implementing the job's statements)
+            job: Cleanup job to run
+
+        Returns:
+            Report with rows deleted, batches, rows/sec and lock wait times
+        """
+        report = {
+            "rows": 0, "batches": 0, "lock_wait_ms": 0.0, "max_lock_wait_ms": 0.0,
+            "lock_timeouts": 0, "seconds": 0.0, "rows_per_sec": 0.0
+        }
+        args = job.args()
+        started = time.perf_counter()
+
+        while True:
+            try:
+                rows, lock_wait = await self._delete_batch(pool, job, args)
+            except asyncpg.LockNotAvailableError:
+                report["lock_timeouts"] += 1
+                if report["lock_timeouts"] >= self.max_lock_timeouts:
+                    logger.warning("⚠️ %s cleanup stopped: table lock unavailable", job.name)
+                    break
+                await asyncio.sleep(self.pause * 10)
+                continue
+
+            report["batches"] += 1
+            report["rows"] += len(rows)
+            report["lock_wait_ms"] += lock_wait * 1000
+            report["max_lock_wait_ms"] = max(report["max_lock_wait_ms"], lock_wait * 1000)
+
+            if rows and job.on_batch:
+                await job.on_batch(rows)
+            if len(rows) < self.batch_size:
+                break
+            await asyncio.sleep(self.pause)
+
+        report["seconds"] = time.perf_counter() - started
+        if report["seconds"] > 0:
+            report["rows_per_sec"] = report["rows"] / report["seconds"]
+        for key in ("lock_wait_ms", "max_lock_wait_ms", "seconds", "rows_per_sec"):
+            report[key] = round(report[key], 3)
+        return report
+
+    async def _delete_batch(self, pool, job: CleanupJob, args: tuple):
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await statement(conn, "set_lock_timeout").fetchval(f"{int(self.lock_timeout * 1000)}ms")
+                lock_started = time.perf_counter()
+                await statement(conn, job.lock_statement).fetch()
+                lock_wait = time.perf_counter() - lock_started
+                rows = await statement(conn, job.delete_statement).fetch(*args, self.batch_size)
+        return rows, lock_wait
+
+
+if __name__ == "__main__":
+    # Delete 25k expired tokens in batches on the in-memory backend
+    from datetime import datetime, timedelta, timezone
+    from memory_backend import MemoryPostgres
+
+    async def test_engine():
+        pool = MemoryPostgres()
+        expired = datetime.now(timezone.utc) - timedelta(hours=1)
+        async with pool.acquire() as conn:
+            await statement(conn, "oauth_upsert").executemany([
+                (f"user{i}@example.com", "token", "refresh", expired, "gmail") for i in range(25000)
+            ])
+
+        batches: List[int] = []
+
+        async def on_batch(rows):
+            batches.append(len(rows))
+
+        engine = CleanupEngine(batch_size=1000, pause=0)
+        report = await engine.run(pool, CleanupJob(
+            "oauth_tokens", "oauth_lock", "oauth_delete_expired", on_batch=on_batch
+        ))
+        assert report["rows"] == 25000 and max(batches) == 1000, report
+        assert not pool.db.oauth_tokens
+        print(report)
+
+    asyncio.run(test_engine())
@@ -0,0 +1,345 @@
+"""
+PayShield Compiled Wordlist
+Precompiled, memory-mapped challenge wordlist shared by every worker process
+"""
+
+import functools
+import inspect
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Union
+
+import phonetic_index
+from phonetic_index import PhoneticIndex
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"PSWL"
+VERSION = 2
+
+# magic, version, reserved, word count, blob bytes, neighbour count,
+# source size, source mtime (ns), rules fingerprint, CRC-32 of everything
+# after the header. All integers are little-endian; the header is 44
+# bytes, so the offset arrays that follow are 4-byte aligned.
+_HEADER = struct.Struct("<4sHHIIIQQII")
+
+# Compiled files are a cache: kept per user, outside the source tree
+CACHE_DIR = os.getenv("WORDLIST_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "payshield")
+
+# Neighbour lists store 16-bit word indices, the same range the entropy
+# buffer draws from
+MAX_WORDS = 1 << 16
+
+
+@functools.lru_cache(maxsize=1)
+def rules_fingerprint() -> int:
+    """
+    CRC-32 of the phonetic_index source
+
+    Stored in compiled files, so a change to the confusability rules makes
+    them stale without a VERSION bump.
+    """
+    try:
+        source = inspect.getsource(phonetic_index).encode()
+    except OSError:  # bytecode-only deployment
+        source = marshal.dumps(phonetic_index.__spec__.loader.get_code(phonetic_index.__name__))
+    return zlib.crc32(source)
+
+
+def compiled_path(text_path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Where the compiled form of a text wordlist is cached
+
+    Named after the wordlist and a hash of its absolute path, so lists with
+    the same name in different directories don't share a file, e.g.
+    ~/.cache/payshield/diceware-1a2b3c4d.bin
+
+    Args:
+        text_path: Text wordlist
+        cache_dir: Directory for compiled files; defaults to CACHE_DIR
+                   (WORDLIST_CACHE_DIR or ~/.cache/payshield)
+    """
+    source = Path(text_path).resolve()
+    return Path(cache_dir or CACHE_DIR) / f"{source.stem}-{zlib.crc32(str(source).encode()):08x}.bin"
+
+
+def _u32(view: memoryview, start: int, count: int) -> Sequence[int]:
+    values = view[start:start + 4 * count]
+    if sys.byteorder == "little":
+        return values.cast("I")
+    swapped = array("I", values.tobytes())
+    swapped.byteswap()
+    return swapped
+
+
+def _u16(view: memoryview, start: int, count: int) -> Sequence[int]:
+    values = view[start:start + 2 * count]
+    if sys.byteorder == "little":
+        return values.cast("H")
+    swapped = array("H", values.tobytes())
+    swapped.byteswap()
+    return swapped
+
+
+class CompiledWordlist(Sequence[str]):
+    """
+    Read-only view of a compiled wordlist
+
+    File layout after the header:
+    - (count + 1) uint32 offsets into the blob; word i is blob[o[i]:o[i+1]]
+    - the UTF-8 blob, zero-padded to a multiple of 4 bytes
+    - (count + 1) uint32 offsets into the neighbour array
+    - uint16 indices of the words confusable with each word (see PhoneticIndex)
+
+    The file is mapped read-only, so every process shares the same page
+    cache copy. Words are decoded on first access and kept, so repeated
+    lookups cost the same as indexing a list.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Map and validate a compiled wordlist
+
+        Args:
+            path: Compiled wordlist file
+
+        Raises:
+            ValueError: Not a compiled wordlist, unsupported version or checksum mismatch
+        """
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+
+        if len(view) < _HEADER.size:
+            raise ValueError(f"{self.path} is too short for a compiled wordlist")
+        (magic, version, _, count, blob_size, neighbour_count,
+         self.source_size, self.source_mtime_ns, self.rules, checksum) = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a compiled wordlist")
+        if version != VERSION:
+            raise ValueError(f"{self.path} has format version {version}, expected {VERSION}")
+
+        blob_start = _HEADER.size + 4 * (count + 1)
+        neighbours_start = blob_start + (blob_size + 3) // 4 * 4
+        indices_start = neighbours_start + 4 * (count + 1)
+        if len(view) != indices_start + 2 * neighbour_count:
+            raise ValueError(f"{self.path} is truncated or has trailing data")
+        if zlib.crc32(view[_HEADER.size:]) != checksum:
+            raise ValueError(f"{self.path} failed its checksum")
+
+        self._count = count
+        self._offsets = _u32(view, _HEADER.size, count + 1)
+        self._blob = view[blob_start:blob_start + blob_size]
+        self._neighbour_offsets = _u32(view, neighbours_start, count + 1)
+        self._neighbours = _u16(view, indices_start, neighbour_count)
+        self._decoded: List[Optional[str]] = [None] * count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        # Reads and fills of the decode cache race harmlessly: both threads
+        # decode the same bytes
+        word = self._decoded[index]
+        if word is None:
+            if index < 0:
+                index += self._count
+            word = self._decoded[index] = str(self._blob[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+        return word
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self[i]
+
+    def neighbours(self, index: int) -> Sequence[int]:
+        """Indices of the words confusable with word index (excluding itself)"""
+        return self._neighbours[self._neighbour_offsets[index]:self._neighbour_offsets[index + 1]]
+
+    def is_current(self, text_path: Union[str, Path]) -> bool:
+        """Whether this was compiled from the text file as it is now, with the current rules"""
+        try:
+            stat = os.stat(text_path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_size == self.source_size and stat.st_mtime_ns == self.source_mtime_ns
+                and self.rules == rules_fingerprint())
+
+
+def read_text_wordlist(text_path: Union[str, Path]) -> List[str]:
+    """One word per line, blank lines skipped"""
+    with open(text_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def compile_wordlist(text_path: Union[str, Path], out_path: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Compile a text wordlist and its phonetic index into the binary format
+
+    The file is written under a temporary name and renamed over out_path,
+    so readers see either the old file or the complete new one. Processes
+    that still map the old file keep a valid mapping.
+
+    Args:
+        text_path: Text wordlist (one word per line)
+        out_path: Destination; defaults to compiled_path(text_path)
+
+    Returns:
+        Path of the compiled file
+    """
+    out = Path(out_path) if out_path is not None else compiled_path(text_path)
+    # Other users must not be able to swap in a wordlist of their own
+    out.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Stat before reading: an edit that lands mid-compile makes the result
+    # stale, so the next load compiles again
+    source = os.stat(text_path)
+    words = read_text_wordlist(text_path)
+    if not 0 < len(words) <= MAX_WORDS:
+        raise ValueError(f"Wordlist must contain 1 to {MAX_WORDS} words, got {len(words)}")
+
+    offsets = array("I", [0])
+    encoded = []
+    for word in words:
+        data = word.encode("utf-8")
+        encoded.append(data)
+        offsets.append(offsets[-1] + len(data))
+    blob = b"".join(encoded)
+
+    neighbour_offsets = array("I", [0])
+    neighbours = array("H")
+    for i, mask in enumerate(PhoneticIndex(words).masks):
+        mask &= ~(1 << i)
+        while mask:
+            lowest = mask & -mask
+            neighbours.append(lowest.bit_length() - 1)
+            mask ^= lowest
+        neighbour_offsets.append(len(neighbours))
+
+    if sys.byteorder != "little":
+        for values in (offsets, neighbour_offsets, neighbours):
+            values.byteswap()
+    body = b"".join([
+        offsets.tobytes(), blob, b"\0" * (-len(blob) % 4),
+        neighbour_offsets.tobytes(), neighbours.tobytes()
+    ])
+    header = _HEADER.pack(
+        MAGIC, VERSION, 0, len(words), len(blob), len(neighbours),
+        source.st_size, source.st_mtime_ns, rules_fingerprint(), zlib.crc32(body)
+    )
+
+    # Unique temp file, so concurrent compiles (processes or threads) never share one
+    fd, temp = tempfile.mkstemp(prefix=f".{out.name}.", suffix=".tmp", dir=out.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, out)
+    finally:
+        if os.path.exists(temp):
+            os.unlink(temp)
+    logger.info("🗂️ Compiled %s words from %s into %s", len(words), text_path, out)
+    return out
+
+
+def load_wordlist(text_path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None) -> CompiledWordlist:
+    """
+    Map the compiled form of a text wordlist, compiling it first if it is
+    missing, stale (text or rules changed) or corrupt
+
+    Without the text source, a compiled file shipped next to it
+    (diceware.txt -> diceware.bin) is used as is. If the cache directory
+    isn't writable, the wordlist is compiled to a private temporary file
+    for this process.
+
+    Args:
+        text_path: Text wordlist (one word per line)
+        cache_dir: Directory for compiled files; defaults to CACHE_DIR
+
+    Raises:
+        FileNotFoundError: Neither the text nor a compiled wordlist exists
+    """
+    if not os.path.exists(text_path):
+        shipped = Path(text_path).with_suffix(".bin")
+        try:
+            return CompiledWordlist(shipped)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Wordlist not found at {text_path} (or compiled at {shipped})")
+
+    out = compiled_path(text_path, cache_dir)
+    try:
+        wordlist = CompiledWordlist(out)
+        if wordlist.is_current(text_path):
+            return wordlist
+        logger.info("Compiled wordlist %s is stale for %s, recompiling", out, text_path)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning("⚠️ %s, recompiling", e)
+
+    try:
+        return CompiledWordlist(compile_wordlist(text_path, out))
+    except PermissionError:
+        fd, fallback = tempfile.mkstemp(prefix="payshield-", suffix=f"-{out.name}")
+        os.close(fd)
+        logger.warning("⚠️ Cannot write %s, using %s", out, fallback)
+        try:
+            return CompiledWordlist(compile_wordlist(text_path, fallback))
+        finally:
+            # Mapped already; the mapping outlives the name
+            os.unlink(fallback)
+
+
+if __name__ == "__main__":
+    # Compile a wordlist (e.g. at build time) and compare startup cost
+    # against parsing the text file and rebuilding the phonetic index
+    import time
+
+    # Pass an output path (e.g. diceware.bin beside the text) to build a
+    # file to ship; by default it goes to the cache directory
+    text_path = sys.argv[1] if len(sys.argv) > 1 else "diceware.txt"
+    out = compile_wordlist(text_path, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Compiled {text_path} -> {out} ({out.stat().st_size} bytes)")
+
+    def per_load(fn, runs: int = 20) -> float:
+        started = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        return (time.perf_counter() - started) / runs * 1000
+
+    text_ms = per_load(lambda: PhoneticIndex(read_text_wordlist(text_path)))
+
+    def mapped_load():
+        wordlist = CompiledWordlist(out)
+        return PhoneticIndex.from_neighbours(wordlist, wordlist.neighbours)
+
+    mapped_ms = per_load(mapped_load)
+    print(f"Startup: text + phonetic index {text_ms:.2f}ms, compiled {mapped_ms:.2f}ms "
+          f"({text_ms / mapped_ms:.0f}x faster)")
+
+    words = read_text_wordlist(text_path)
+    compiled = CompiledWordlist(out)
+    assert list(compiled) == words and compiled[-1] == words[-1]
+    assert PhoneticIndex.from_neighbours(compiled, compiled.neighbours).masks == PhoneticIndex(words).masks
+    print("Compiled words and confusability match the text wordlist")
+
+    corrupt = out.with_name(f".{out.name}.corrupt")
+    data = bytearray(out.read_bytes())
+    data[-1] ^= 1
+    corrupt.write_bytes(data)
+    try:
+        CompiledWordlist(corrupt)
+        print("Corruption went undetected")
+    except ValueError as e:
+        print(f"Corruption detected: {e}")
+    finally:
+        corrupt.unlink()
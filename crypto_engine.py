@@ -16,9 +16,10 @@ from pathlib import Path
 from typing import Dict, Any
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
-import logging
 
-logger = logging.getLogger(__name__)
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
 
 # Key file paths
 PRIVATE_KEY_PATH = Path("keys/private.pem")
@@ -53,7 +54,7 @@ def _load_private_key() -> bytes:
         with open(PRIVATE_KEY_PATH, 'rb') as key_file:
             return key_file.read()
     except Exception as e:
-        logger.error(f"Failed to load private key: {e}")
+        logger.error("Failed to load private key: %s", e)
         raise KeyNotFoundError(f"Could not load private key: {e}")
 
 
@@ -66,7 +67,7 @@ def _load_public_key() -> bytes:
         with open(PUBLIC_KEY_PATH, 'rb') as key_file:
             return key_file.read()
     except Exception as e:
-        logger.error(f"Failed to load public key: {e}")
+        logger.error("Failed to load public key: %s", e)
         raise KeyNotFoundError(f"Could not load public key: {e}")
 
 
@@ -156,11 +157,11 @@ def create_badge(email: str, voice_hash: str) -> str:
             algorithm=JWT_ALGORITHM
         )
         
-        logger.info(f"Created verification badge for {email}")
+        logger.info("Created verification badge for %s", email)
         return jwt_token
         
     except Exception as e:
-        logger.error(f"Failed to create badge for {email}: {e}")
+        logger.error("Failed to create badge for %s: %s", email, e)
         raise CryptoEngineError(f"Badge creation failed: {e}")
 
 
@@ -206,7 +207,7 @@ def verify_badge(jwt_string: str) -> Dict[str, Any]:
             if field not in payload:
                 raise BadgeVerificationError(f"Missing required field: {field}")
         
-        logger.info(f"Successfully verified badge for {payload['email']}")
+        logger.info("Successfully verified badge for %s", payload["email"])
         return payload
         
     except jwt.ExpiredSignatureError:
@@ -214,11 +215,11 @@ def verify_badge(jwt_string: str) -> Dict[str, Any]:
         raise BadgeVerificationError("Badge has expired")
     
     except jwt.InvalidTokenError as e:
-        logger.warning(f"Badge verification failed: invalid token - {e}")
+        logger.warning("Badge verification failed: invalid token - %s", e)
         raise BadgeVerificationError(f"Invalid badge: {e}")
     
     except Exception as e:
-        logger.error(f"Badge verification failed: {e}")
+        logger.error("Badge verification failed: %s", e)
         raise BadgeVerificationError(f"Verification failed: {e}")
 
 
@@ -237,7 +238,7 @@ def get_public_key_pem() -> str:
         public_key_bytes = _load_public_key()
         return public_key_bytes.decode('utf-8')
     except Exception as e:
-        logger.error(f"Failed to get public key: {e}")
+        logger.error("Failed to get public key: %s", e)
         raise CryptoEngineError(f"Could not retrieve public key: {e}")
 
 
@@ -246,4 +247,4 @@ try:
     _generate_key_pair()
     logger.info("Crypto engine initialized successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize crypto engine: {e}")
+    logger.error("Failed to initialize crypto engine: %s", e)
@@ -0,0 +1,156 @@
+"""
+PayShield Entropy Buffer
+Uniform random indices served from pre-drawn os.urandom blocks
+"""
+
+import os
+import threading
+import weakref
+from array import array
+from typing import Any, Dict, List, Optional
+
+# Indices are drawn from 16-bit values, so bounds up to 65536 (a standard
+# 7776-word Diceware list fits easily)
+_VALUE_RANGE = 1 << 16
+
+
+class EntropyBuffer:
+    """
+    Pre-drawn CSPRNG output for index sampling
+
+    One os.urandom() call fills a block of 16-bit values. Indices below a
+    bound are taken by rejection sampling: values at or above the largest
+    multiple of the bound are discarded, so value % bound is exactly
+    uniform (no modulo bias). Every value is served at most once.
+
+    When the block runs low a fresh one is drawn on a background thread and
+    swapped in when the current block is exhausted. A forked child discards
+    both blocks, so worker processes never share random bytes with their
+    parent.
+    """
+
+    def __init__(self, block_bytes: int = 65536, refill_at: float = 0.25):
+        """
+        Initialize the buffer (the first block is drawn on first use)
+
+        Args:
+            block_bytes: Bytes drawn per os.urandom() call
+            refill_at: Fraction of the block left when the background refill starts
+        """
+        self.block_bytes = block_bytes - block_bytes % 2
+        self.low_water = int(self.block_bytes // 2 * refill_at)
+        self.draws = 0
+        self.sync_draws = 0
+        self.rejected = 0
+        self._reset()
+
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._reset())
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._values = array("H")
+        self._pos = 0
+        self._standby: Optional[array] = None
+        self._refilling = False
+
+    def _draw(self) -> array:
+        self.draws += 1
+        return array("H", os.urandom(self.block_bytes))
+
+    def _refill(self) -> None:
+        values = self._draw()
+        with self._lock:
+            self._standby = values
+            self._refilling = False
+
+    def _next_block(self) -> None:
+        """Swap in the standby block, or draw inline if it isn't ready"""
+        if self._standby is not None:
+            self._values, self._standby = self._standby, None
+        else:
+            self.sync_draws += 1
+            self._values = self._draw()
+        self._pos = 0
+
+    def _take(self, count: int) -> array:
+        """Next count unused values (caller holds the lock)"""
+        end = self._pos + count
+        if end <= len(self._values):
+            values = self._values[self._pos:end]
+            self._pos = end
+        else:
+            values = array("H")
+            while len(values) < count:
+                if self._pos >= len(self._values):
+                    self._next_block()
+                chunk = self._values[self._pos:self._pos + count - len(values)]
+                self._pos += len(chunk)
+                values.extend(chunk)
+
+        if (not self._refilling and self._standby is None
+                and len(self._values) - self._pos < self.low_water):
+            self._refilling = True
+            threading.Thread(target=self._refill, name="entropy-refill", daemon=True).start()
+        return values
+
+    def indices(self, count: int, bound: int) -> List[int]:
+        """
+        Uniform random integers in [0, bound)
+
+        Args:
+            count: Number of indices
+            bound: Exclusive upper bound (1 to 65536)
+
+        Returns:
+            count independent, uniformly distributed indices
+        """
+        if not 0 < bound <= _VALUE_RANGE:
+            raise ValueError(f"bound must be between 1 and {_VALUE_RANGE}, got {bound}")
+        limit = _VALUE_RANGE - _VALUE_RANGE % bound
+
+        result: List[int] = []
+        with self._lock:
+            # 65536 % bound of every 65536 values are rejected (0.4% for a
+            # 373-word list), so a second pass is seldom needed
+            while len(result) < count:
+                chunk = self._take(count - len(result))
+                accepted = [value % bound for value in chunk if value < limit]
+                self.rejected += len(chunk) - len(accepted)
+                result.extend(accepted)
+        return result
+
+    def token_bytes(self, nbytes: int) -> bytes:
+        """Random bytes from the buffer (e.g. for identifiers)"""
+        with self._lock:
+            values = self._take((nbytes + 1) // 2)
+        return values.tobytes()[:nbytes]
+
+    def stats(self) -> Dict[str, Any]:
+        """Draw counters for health checks"""
+        return {
+            "draws": self.draws,
+            "sync_draws": self.sync_draws,
+            "rejected": self.rejected,
+            "remaining": len(self._values) - self._pos
+        }
+
+
+if __name__ == "__main__":
+    # Uniformity check for a bound that doesn't divide 65536
+    from collections import Counter
+
+    buffer = EntropyBuffer()
+    bound, samples = 373, 2_000_000
+    counts = Counter(buffer.indices(samples, bound))
+    expected = samples / bound
+    chi_square = sum((counts[i] - expected) ** 2 / expected for i in range(bound))
+    # 372 degrees of freedom: mean 372, standard deviation ~27
+    print(f"chi-square over {bound} buckets: {chi_square:.1f} (expect ~372 +/- 27)")
+    print(buffer.stats())
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if buffer.stats()["remaining"] == 0 else 1)
+    _, status = os.waitpid(pid, 0)
+    print(f"Forked child starts with an empty buffer: {os.waitstatus_to_exitcode(status) == 0}")
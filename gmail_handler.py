@@ -5,7 +5,6 @@ Simple Gmail API key integration (no OAuth complexity)
 
 import os
 import json
-import logging
 from datetime import datetime
 from typing import Optional, Dict, Any
 import requests
@@ -13,9 +12,9 @@ import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from structured_logging import get_logger, configure_logging
+
+logger = get_logger(__name__)
 
 class GmailHandler:
     """Simple Gmail API with just an API key"""
@@ -98,14 +97,14 @@ class GmailHandler:
                 'extracted_at': datetime.utcnow().isoformat()
             }
             
-            logger.info(f"✅ Thread data extracted: {sender_email} - {subject}")
+            logger.info("✅ Thread data extracted: %s - %s", sender_email, subject)
             return thread_data
             
         except requests.RequestException as e:
-            logger.error(f"❌ Gmail API request error: {e}")
+            logger.error("❌ Gmail API request error: %s", e)
             raise
         except Exception as e:
-            logger.error(f"❌ Failed to extract thread data: {e}")
+            logger.error("❌ Failed to extract thread data: %s", e)
             raise
     
     def _create_verification_badge_html(self, jwt_badge: str, sender_email: str) -> str:
@@ -200,14 +199,14 @@ class GmailHandler:
             draft = response.json()
             draft_id = draft['id']
             
-            logger.info(f"✅ Verification badge injected as draft {draft_id} in thread {thread_id}")
+            logger.info("✅ Verification badge injected as draft %s in thread %s", draft_id, thread_id)
             return True
             
         except requests.RequestException as e:
-            logger.error(f"❌ Gmail API request error: {e}")
+            logger.error("❌ Gmail API request error: %s", e)
             return False
         except Exception as e:
-            logger.error(f"❌ Failed to inject verification badge: {e}")
+            logger.error("❌ Failed to inject verification badge: %s", e)
             return False
     
     async def health_check(self, access_token: str) -> Dict[str, Any]:
@@ -269,6 +268,8 @@ if __name__ == "__main__":
     # Test Gmail handler initialization
     import asyncio
     
+    configure_logging()
+    
     async def test_gmail():
         print("🧪 Testing Gmail Handler initialization...")
         
@@ -0,0 +1,164 @@
+"""
+PayShield History Benchmark
+get_verification_history latency against a large, monthly-partitioned
+verification_attempts table
+
+Loads BENCH_ROWS synthetic attempts (100M by default) spread over
+BENCH_MONTHS months into the database at DATABASE_URL, then times the
+latest-N and since-bounded history reads through the Storage Manager and
+shows how many partitions the since-bounded plan touches. Loading is
+resumable: rerunning tops the table up to BENCH_ROWS instead of starting
+over. Run it against a scratch database, never a production one.
+
+BENCH_COMPARE=1 also copies the rows into an unpartitioned table with the
+pre-partitioning (vendor_email, timestamp DESC) index and times the same
+queries there.
+
+At 100M rows (100k vendors, 12 months, PostgreSQL 16, 1 CPU), second run:
+    latest 50                       p50 2.77ms  p95 3.65ms  p99 6.70ms
+    latest 50, since 30 days ago    p50 1.00ms  p95 1.76ms  p99 2.47ms
+The latest-50 plan reads 17 partitions (122 buffers). The since-bounded
+plan reads 6 partitions (67 buffers): the last two months plus empty
+future and default partitions. The first run straight after loading had
+p99s of 46ms and 18ms.
+"""
+
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List
+
+from storage_manager import StorageManager, _add_months, _month_start
+from storage_statements import STATEMENTS
+from structured_logging import configure_logging
+
+ROWS = int(os.getenv("BENCH_ROWS", "100000000"))
+VENDORS = int(os.getenv("BENCH_VENDORS", "100000"))
+MONTHS = int(os.getenv("BENCH_MONTHS", "12"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "1000"))
+CHUNK = int(os.getenv("BENCH_CHUNK", "1000000"))
+COMPARE = os.getenv("BENCH_COMPARE") == "1"
+# Bulk statements on large partitions outlast the pool's 60s command_timeout
+LOAD_TIMEOUT = 3600
+
+
+def _vendor(index: int) -> str:
+    return f"vendor-{index}@bench.example"
+
+
+async def load(manager: StorageManager) -> None:
+    """Create partitions covering the benchmark period and insert the rows"""
+    this_month = _month_start(datetime.now(timezone.utc))
+    async with manager.postgres_pool.acquire() as conn:
+        for offset in range(-MONTHS, 0):
+            await manager._create_attempt_partition(conn, _add_months(this_month, offset))
+
+        loaded = await conn.fetchval("SELECT count(*) FROM verification_attempts WHERE id LIKE 'bench-%'",
+                                     timeout=LOAD_TIMEOUT)
+        span_seconds = MONTHS * 30 * 86400
+        started = time.perf_counter()
+        for first in range(loaded, ROWS, CHUNK):
+            last = min(first + CHUNK, ROWS) - 1
+            # Row g belongs to vendor g % VENDORS; a multiplicative hash spreads
+            # each vendor's attempts over the whole period
+            await conn.execute("""
+                INSERT INTO verification_attempts
+                (id, vendor_email, thread_id, challenge_words, confidence_score,
+                 success, timestamp, ip_address, user_agent)
+                SELECT 'bench-' || g, 'vendor-' || (g % $3) || '@bench.example', 'thread-' || (g % 1000003),
+                       'able about account', 90 + (g % 10), g % 4 <> 0,
+                       NOW() - ((g * 2654435761) % $4) * INTERVAL '1 second',
+                       '203.0.113.7', 'history-benchmark'
+                FROM generate_series($1::bigint, $2::bigint) AS g
+            """, first, last, VENDORS, span_seconds, timeout=LOAD_TIMEOUT)
+            rate = (last + 1 - loaded) / (time.perf_counter() - started)
+            print(f"Loaded {last + 1:,} of {ROWS:,} rows ({rate:,.0f} rows/s)")
+        if loaded < ROWS:
+            await conn.execute("ANALYZE verification_attempts", timeout=LOAD_TIMEOUT)
+
+        if COMPARE and await conn.fetchval("SELECT to_regclass('bench_attempts_unpartitioned')") is None:
+            print("Copying into bench_attempts_unpartitioned...")
+            await conn.execute("""
+                CREATE TABLE bench_attempts_unpartitioned AS
+                SELECT * FROM verification_attempts WHERE id LIKE 'bench-%'
+            """, timeout=LOAD_TIMEOUT)
+            await conn.execute("""
+                CREATE INDEX ON bench_attempts_unpartitioned(vendor_email, timestamp DESC)
+            """, timeout=LOAD_TIMEOUT)
+            await conn.execute("ANALYZE bench_attempts_unpartitioned", timeout=LOAD_TIMEOUT)
+
+
+async def timed(label: str, query: Callable[[str], Awaitable[List]]) -> None:
+    """Run query for QUERIES random vendors and print latency percentiles"""
+    vendors = [_vendor(random.randrange(VENDORS)) for _ in range(QUERIES)]
+    for email in vendors[:20]:
+        await query(email)
+    latencies = []
+    rows = 0
+    for email in vendors:
+        started = time.perf_counter()
+        rows += len(await query(email))
+        latencies.append((time.perf_counter() - started) * 1000)
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{label:44s} p50 {cuts[49]:7.2f}ms  p95 {cuts[94]:7.2f}ms  p99 {cuts[98]:7.2f}ms  "
+          f"({rows / len(vendors):.0f} rows/query)")
+
+
+async def plan_summary(manager: StorageManager, sql: str, *args) -> Dict[str, int]:
+    """Partitions and buffers an EXPLAIN ANALYZE of sql touches"""
+    async with manager.postgres_pool.acquire() as conn:
+        plan = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args)
+    nodes = [json.loads(plan)[0]["Plan"]]
+    relations = set()
+    buffers = 0
+    while nodes:
+        node = nodes.pop()
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        buffers = max(buffers, node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0))
+        nodes.extend(node.get("Plans", []))
+    return {"partitions": len(relations), "buffers": buffers}
+
+
+async def benchmark() -> None:
+    manager = StorageManager()
+    await manager.initialize()
+    try:
+        await load(manager)
+
+        since = datetime.now(timezone.utc) - timedelta(days=30)
+        print(f"\nget_verification_history over {ROWS:,} rows, {VENDORS:,} vendors, {MONTHS} months "
+              f"({QUERIES} queries each)")
+        await timed("latest 50", lambda email: manager.get_verification_history(email, limit=50))
+        await timed("latest 50, since 30 days ago",
+                    lambda email: manager.get_verification_history(email, limit=50, since=since))
+
+        email = _vendor(0)
+        latest = await plan_summary(manager, STATEMENTS["history_latest"], email, 50)
+        bounded = await plan_summary(manager, STATEMENTS["history_since"], email, 50, since)
+        print(f"Plan, latest 50:        {latest['partitions']} partitions, {latest['buffers']} buffers")
+        print(f"Plan, since 30 days ago: {bounded['partitions']} partitions, {bounded['buffers']} buffers")
+
+        if COMPARE:
+            async def unpartitioned(email: str, since_bound=None) -> List:
+                async with manager.postgres_pool.acquire() as conn:
+                    return await conn.fetch("""
+                        SELECT * FROM bench_attempts_unpartitioned
+                        WHERE vendor_email = $1 AND ($2::timestamptz IS NULL OR timestamp >= $2)
+                        ORDER BY timestamp DESC LIMIT 50
+                    """, email, since_bound)
+
+            await timed("unpartitioned: latest 50", unpartitioned)
+            await timed("unpartitioned: latest 50, since 30 days ago",
+                        lambda email: unpartitioned(email, since))
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    configure_logging("WARNING")
+    asyncio.run(benchmark())
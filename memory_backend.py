@@ -0,0 +1,457 @@
+"""
+PayShield In-Memory Storage Backend
+Drop-in stand-ins for the Redis client and PostgreSQL pool used by the
+Storage Manager, for tests, profiling and laptop load tests
+
+Select it with STORAGE_BACKEND=memory (or StorageManager(backend="memory")).
+The Storage Manager only needs:
+
+- a Redis client: async context manager with get/set/setex/getdel/delete/
+  exists/pttl/ping/publish, pipeline() and pubsub()
+- a PostgreSQL pool: acquire() yielding a connection with transaction() and
+  statement(name) for every name in storage_statements.STATEMENTS
+
+MemoryRedis and MemoryPostgres implement exactly that surface, with the same
+semantics as the servers: TTL expiry, upserts, ON CONFLICT DO NOTHING and
+history ordered by (timestamp, id) descending. Nothing is persisted.
+"""
+
+import asyncio
+import bisect
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from storage_statements import ATTEMPT_FIELDS, OAUTH_FIELDS, STATEMENTS, VENDOR_FIELDS
+
+
+class MemoryRedis:
+    """Single-process Redis stand-in (bytes values, millisecond TTLs, pub/sub)"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    # The Storage Manager uses clients as async context managers
+    async def __aenter__(self) -> "MemoryRedis":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def disconnect(self) -> None:
+        """Pool-style shutdown (nothing to release)"""
+        self._subscribers.clear()
+
+    def _live(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def setex(self, key: str, ttl: int, value: Any) -> bool:
+        if isinstance(value, str):
+            value = value.encode()
+        self._data[key] = (bytes(value), time.monotonic() + ttl)
+        return True
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key):
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        self._data[key] = (bytes(value), time.monotonic() + ex if ex is not None else None)
+        return True
+
+    async def getdel(self, key: str) -> Optional[bytes]:
+        entry = self._live(key)
+        if entry is None:
+            return None
+        del self._data[key]
+        return entry[0]
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._live(key) and self._data.pop(key, None))
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._live(key))
+
+    async def pttl(self, key: str) -> int:
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, int((entry[1] - time.monotonic()) * 1000))
+
+    async def publish(self, channel: str, message: Any) -> int:
+        if isinstance(message, str):
+            message = message.encode()
+        subscribers = self._subscribers.get(channel, ())
+        for queue in subscribers:
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": message})
+        return len(subscribers)
+
+    def pipeline(self, transaction: bool = False) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+
+class MemoryPipeline:
+    """Queues commands and runs them in order on execute()"""
+
+    def __init__(self, client: MemoryRedis):
+        self._client = client
+        self._commands: List[Tuple[Callable, tuple]] = []
+
+    async def __aenter__(self) -> "MemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands.clear()
+
+    def __getattr__(self, name: str) -> Callable:
+        command = getattr(self._client, name)
+
+        def queue(*args):
+            self._commands.append((command, args))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return [await command(*args) for command, args in commands]
+
+
+class MemoryPubSub:
+    """Subscription handle mirroring redis.asyncio.client.PubSub"""
+
+    def __init__(self, client: MemoryRedis):
+        self._client = client
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._channels: List[str] = []
+
+    async def __aenter__(self) -> "MemoryPubSub":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        for channel in self._channels:
+            self._client._subscribers.get(channel, set()).discard(self._queue)
+        self._channels.clear()
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self._client._subscribers.setdefault(channel, set()).add(self._queue)
+            self._channels.append(channel)
+            self._queue.put_nowait({"type": "subscribe", "channel": channel.encode(), "data": len(self._channels)})
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        while True:
+            yield await self._queue.get()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class MemoryDatabase:
+    """Tables of the PayShield schema held in dicts, rows as column-ordered tuples"""
+
+    def __init__(self):
+        self.oauth_tokens: Dict[str, Dict[str, Any]] = {}
+        self.vendor_profiles: Dict[str, Dict[str, Any]] = {}
+        # Per vendor, sorted ascending by (timestamp, id); the primary key is (id, timestamp)
+        self.attempts: Dict[str, List[Tuple[Tuple[datetime, str], tuple]]] = {}
+        self.attempt_keys: Set[Tuple[str, datetime]] = set()
+
+
+class MemoryRecord(tuple):
+    """Row readable by index or column name, like asyncpg.Record"""
+
+    __slots__ = ()
+    columns: Tuple[str, ...] = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self.columns.index(key))
+        return tuple.__getitem__(self, key)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.columns
+
+
+class VendorRecord(MemoryRecord):
+    __slots__ = ()
+    columns = VENDOR_FIELDS
+
+
+class OAuthRecord(MemoryRecord):
+    __slots__ = ()
+    columns = OAUTH_FIELDS
+
+
+class AttemptRecord(MemoryRecord):
+    __slots__ = ()
+    columns = ATTEMPT_FIELDS
+
+
+class MemoryStatement:
+    """One named statement; same call surface as storage_statements.BoundStatement"""
+
+    def __init__(self, rows: Callable[..., List[tuple]]):
+        self._rows = rows
+
+    async def fetch(self, *args) -> List[tuple]:
+        return self._rows(*args)
+
+    async def fetchrow(self, *args) -> Optional[tuple]:
+        rows = self._rows(*args)
+        return rows[0] if rows else None
+
+    async def fetchval(self, *args) -> Any:
+        row = await self.fetchrow(*args)
+        return row[0] if row else None
+
+    async def executemany(self, args: List[tuple]) -> None:
+        for row_args in args:
+            self._rows(*row_args)
+
+    async def cursor(self, *args, prefetch: Optional[int] = None) -> AsyncIterator[tuple]:
+        for row in self._rows(*args):
+            yield row
+
+
+class MemoryConnection:
+    """Connection handed out by MemoryPostgres.acquire()"""
+
+    def __init__(self, db: MemoryDatabase):
+        self._db = db
+        self._statements = {
+            "oauth_upsert": self._oauth_upsert,
+            "oauth_delete_expired": self._oauth_delete_expired,
+            "vendor_delete_expired": self._vendor_delete_expired,
+            "attempt_delete_before": self._attempt_delete_before,
+            "oauth_get": self._oauth_get,
+            "vendor_upsert": self._vendor_upsert,
+            "vendor_get": self._vendor_get,
+            "vendor_fold_counts": self._vendor_fold_counts,
+            "attempt_insert": self._attempt_insert,
+            "history_latest": lambda email, limit: self._history(email, limit),
+            "history_since": lambda email, limit, since: self._history(email, limit, since),
+            "history_page_first": lambda email, limit: self._history(email, limit),
+            "history_page_after": lambda email, limit, timestamp, attempt_id:
+                self._history(email, limit, before=(timestamp, attempt_id)),
+            "history_stream": lambda email: self._history(email),
+            "history_stream_since": lambda email, since: self._history(email, since=since),
+            "ping": lambda: [(1,)],
+            # No concurrent transactions, so there is nothing to lock
+            "set_lock_timeout": lambda timeout: [(timeout,)],
+            "oauth_lock": lambda: [],
+            "vendor_lock": lambda: [],
+            "attempt_lock": lambda: [],
+        }
+
+    def statement(self, name: str) -> MemoryStatement:
+        return MemoryStatement(self._statements[name])
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        # Statements never yield to the event loop midway, so they are atomic already
+        yield
+
+    def _oauth_upsert(self, user_email, access_token, refresh_token, expires_at, scope) -> List[tuple]:
+        row = self._db.oauth_tokens.get(user_email)
+        if row is None:
+            row = self._db.oauth_tokens[user_email] = {"created_at": _now()}
+        row.update(access_token=access_token, refresh_token=refresh_token,
+                   expires_at=expires_at, scope=scope, updated_at=_now())
+        return []
+
+    def _oauth_delete_expired(self, limit) -> List[tuple]:
+        return self._delete_expired(self._db.oauth_tokens, limit)
+
+    def _vendor_delete_expired(self, limit) -> List[tuple]:
+        return self._delete_expired(self._db.vendor_profiles, limit)
+
+    def _delete_expired(self, table: Dict[str, Dict[str, Any]], limit: int) -> List[tuple]:
+        now = _now()
+        expired = []
+        for key, row in table.items():
+            if row["expires_at"] < now:
+                expired.append((key,))
+                if len(expired) == limit:
+                    break
+        for (key,) in expired:
+            del table[key]
+        return expired
+
+    def _attempt_delete_before(self, cutoff, limit) -> List[tuple]:
+        deleted = []
+        for history in self._db.attempts.values():
+            # Oldest first, so the rows to delete are a prefix
+            count = min(limit - len(deleted), bisect.bisect_left(history, cutoff, key=lambda entry: entry[0][0]))
+            for (timestamp, attempt_id), _ in history[:count]:
+                self._db.attempt_keys.discard((attempt_id, timestamp))
+                deleted.append((attempt_id,))
+            del history[:count]
+            if len(deleted) == limit:
+                break
+        return deleted
+
+    def _oauth_get(self, user_email) -> List[tuple]:
+        row = self._db.oauth_tokens.get(user_email)
+        if row is None or row["expires_at"] <= _now():
+            return []
+        return [OAuthRecord((user_email, row["access_token"], row["refresh_token"], row["expires_at"],
+                             row["scope"], row["created_at"]))]
+
+    def _vendor_upsert(self, email, company_name, contact_name, voiceprint_hash, enrollment_date,
+                       verification_count, confidence_threshold, expires_at) -> List[tuple]:
+        row = self._db.vendor_profiles.get(email)
+        if row is None:
+            row = self._db.vendor_profiles[email] = {
+                "last_verification": None, "verification_count": verification_count, "created_at": _now()
+            }
+        row.update(company_name=company_name, contact_name=contact_name,
+                   voiceprint_hash=voiceprint_hash, enrollment_date=enrollment_date,
+                   confidence_threshold=confidence_threshold, expires_at=expires_at, updated_at=_now())
+        return [(row["verification_count"],)]
+
+    def _vendor_get(self, email) -> List[tuple]:
+        row = self._db.vendor_profiles.get(email)
+        if row is None or row["expires_at"] <= _now():
+            return []
+        return [VendorRecord((email, row["company_name"], row["contact_name"], row["voiceprint_hash"],
+                              row["enrollment_date"], row["last_verification"], row["verification_count"],
+                              row["confidence_threshold"], row["expires_at"]))]
+
+    def _vendor_fold_counts(self, emails, counts, latest) -> List[tuple]:
+        now = _now()
+        for email, count, at in zip(emails, counts, latest):
+            row = self._db.vendor_profiles.get(email)
+            if row is not None:
+                row["verification_count"] += count
+                if at is not None and (row["last_verification"] is None or at > row["last_verification"]):
+                    row["last_verification"] = at
+                row["updated_at"] = now
+        return []
+
+    def _attempt_insert(self, attempt_id, vendor_email, thread_id, challenge_words, confidence_score,
+                        success, timestamp, ip_address, user_agent) -> List[tuple]:
+        if (attempt_id, timestamp) in self._db.attempt_keys:
+            return []
+        self._db.attempt_keys.add((attempt_id, timestamp))
+        row = AttemptRecord((attempt_id, vendor_email, thread_id, challenge_words, confidence_score,
+                             success, timestamp, ip_address, user_agent))
+        history = self._db.attempts.setdefault(vendor_email, [])
+        key = (timestamp, attempt_id)
+        # Appends are the common case: attempts arrive roughly in time order
+        if not history or history[-1][0] <= key:
+            history.append((key, row))
+        else:
+            history.insert(bisect.bisect_right(history, key, key=lambda entry: entry[0]), (key, row))
+        return []
+
+    def _history(self, email, limit: Optional[int] = None, since: Optional[datetime] = None,
+                 before: Optional[Tuple[datetime, str]] = None) -> List[tuple]:
+        """Attempts newest first, by (timestamp, id) descending"""
+        history = self._db.attempts.get(email, [])
+        end = len(history)
+        if before is not None:
+            end = bisect.bisect_left(history, before, key=lambda entry: entry[0])
+        start = 0
+        if since is not None:
+            start = bisect.bisect_left(history, since, key=lambda entry: entry[0][0])
+        if limit is not None:
+            start = max(start, end - limit)
+        return [history[i][1] for i in range(end - 1, start - 1, -1)]
+
+
+class MemoryPostgres:
+    """Pool-shaped wrapper around a MemoryDatabase"""
+
+    def __init__(self):
+        self.db = MemoryDatabase()
+        # Connections hold no per-session state, so one is shared
+        self._conn = MemoryConnection(self.db)
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self._conn
+
+    async def close(self) -> None:
+        pass
+
+
+# Every named statement must have an in-memory implementation
+_missing = set(STATEMENTS) - set(MemoryConnection(MemoryDatabase())._statements)
+assert not _missing, f"memory backend lacks statements: {sorted(_missing)}"
+
+
+if __name__ == "__main__":
+    # Load test of the request path without servers: pure-Python overhead
+    import logging
+    import os
+    import uuid
+    from datetime import timedelta
+
+    from storage_manager import StorageManager, VendorProfile, VerificationAttempt, OAuthToken
+
+    async def load_test():
+        manager = StorageManager(backend="memory")
+        await manager.initialize()
+
+        vendors = [f"vendor{i}@example.com" for i in range(100)]
+        for email in vendors:
+            await manager.store_vendor_profile(VendorProfile(
+                email=email, company_name="Load Co", contact_name="Load",
+                voiceprint_hash="load", enrollment_date=datetime.now(timezone.utc)
+            ))
+        await manager.store_oauth_token(OAuthToken(
+            user_email="ops@example.com", access_token="token", refresh_token="refresh",
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1), scope="gmail",
+            created_at=datetime.now(timezone.utc)
+        ))
+
+        async def verification(i: int):
+            email = vendors[i % len(vendors)]
+            await manager.get_oauth_token("ops@example.com")
+            await manager.get_vendor_profile(email)
+            await manager.log_verification_attempt(VerificationAttempt(
+                id=str(uuid.uuid4()), vendor_email=email, thread_id=f"thread-{i}",
+                challenge_words="able about account", confidence_score=95.0, success=True,
+                timestamp=datetime.now(timezone.utc)
+            ))
+
+        requests = int(os.getenv("LOAD_REQUESTS", "20000"))
+        started = time.perf_counter()
+        for batch in range(0, requests, 500):
+            await asyncio.gather(*(verification(i) for i in range(batch, min(batch + 500, requests))))
+        elapsed = time.perf_counter() - started
+
+        await manager.audit_writer.flush()
+        await manager.count_aggregator.fold()
+        history = await manager.get_verification_history(vendors[0], limit=5)
+        profile = await manager.get_vendor_profile(vendors[0])
+        assert profile.verification_count == requests // len(vendors), profile.verification_count
+        assert [a.timestamp for a in history] == sorted((a.timestamp for a in history), reverse=True)
+
+        print(f"{requests} verifications in {elapsed:.2f}s "
+              f"({requests / elapsed:,.0f}/s, {elapsed / requests * 1e6:.0f} µs each)")
+        print(f"Write amplification: {manager.write_amplification()}")
+        await manager.close()
+
+    # Per-request INFO logs would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(load_test())
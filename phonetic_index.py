@@ -0,0 +1,392 @@
+"""
+PayShield Phonetic Index
+Sound-alike detection for challenge words, so a phrase never pairs words a
+speech-to-text engine is likely to confuse
+"""
+
+import functools
+import math
+import random
+from collections import defaultdict
+from itertools import combinations
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+_VOWELS = set("AEIOU")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"), "L": "4", **dict.fromkeys("MN", "5"), "R": "6"
+}
+
+
+def soundex(word: str) -> str:
+    """American Soundex code, e.g. "robert" -> "R163" """
+    letters = [c for c in word.upper() if c.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W don't separate letters with the same code; vowels do
+        if c not in "HW":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def metaphone(word: str) -> str:
+    """
+    Metaphone key (Lawrence Philips' original rules), e.g. "knight" -> "NT"
+
+    "0" stands for "th" and "X" for "sh"/"ch".
+    """
+    w = "".join(c for c in word.upper() if c.isalpha())
+    if not w:
+        return ""
+    if w[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        w = w[1:]
+    elif w[0] == "X":
+        w = "S" + w[1:]
+    elif w[:2] == "WH":
+        w = "W" + w[2:]
+
+    def at(i: int) -> str:
+        return w[i] if 0 <= i < len(w) else ""
+
+    key = []
+    for i, c in enumerate(w):
+        prev, nxt, after = at(i - 1), at(i + 1), at(i + 2)
+        if c == prev and c != "C":
+            continue
+        if c in _VOWELS:
+            if i == 0:
+                key.append(c)
+        elif c == "B":
+            if not (prev == "M" and i == len(w) - 1):
+                key.append("B")
+        elif c == "C":
+            if nxt == "I" and after == "A":
+                key.append("X")
+            elif nxt == "H":
+                key.append("K" if prev == "S" else "X")
+            elif nxt in ("I", "E", "Y"):
+                if prev != "S":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif c == "D":
+            key.append("J" if nxt == "G" and after in ("E", "I", "Y") else "T")
+        elif c == "G":
+            if nxt == "H" and after and after not in _VOWELS:
+                continue
+            if nxt == "N" and (after == "" or w[i + 2:] == "ED"):
+                continue
+            if prev == "D" and nxt in ("E", "I", "Y"):
+                continue
+            if nxt == "H" and i + 2 >= len(w):
+                continue
+            key.append("J" if nxt in ("I", "E", "Y") and prev != "G" else "K")
+        elif c == "H":
+            if prev in ("C", "G", "P", "S", "T"):
+                continue
+            if prev in _VOWELS and nxt not in _VOWELS:
+                continue
+            key.append("H")
+        elif c == "K":
+            if prev != "C":
+                key.append("K")
+        elif c == "P":
+            key.append("F" if nxt == "H" else "P")
+        elif c == "Q":
+            key.append("K")
+        elif c == "S":
+            if nxt == "H" or (nxt == "I" and after in ("O", "A")):
+                key.append("X")
+            else:
+                key.append("S")
+        elif c == "T":
+            if nxt == "I" and after in ("O", "A"):
+                key.append("X")
+            elif nxt == "H":
+                key.append("0")
+            elif not (nxt == "C" and after == "H"):
+                key.append("T")
+        elif c == "V":
+            key.append("F")
+        elif c in ("W", "Y"):
+            if nxt in _VOWELS:
+                key.append(c)
+        elif c == "X":
+            key.append("KS")
+        elif c == "Z":
+            key.append("S")
+        else:
+            key.append(c)
+    return "".join(key)
+
+
+def edit_distance(a: str, b: str, limit: int = 255) -> int:
+    """
+    Levenshtein distance, capped at limit + 1
+
+    Pairs whose lengths already differ by more than limit, or whose
+    distance provably exceeds it part-way through, stop early.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def _deletes(key: str, depth: int) -> set:
+    """key and every string reachable from it by up to depth deletions"""
+    variants = {key}
+    frontier = {key}
+    for _ in range(depth):
+        frontier = {v[:p] + v[p + 1:] for v in frontier for p in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+class PhoneticIndex:
+    """
+    Precomputed confusability of every pair of words in a list
+
+    Two words are confusable when:
+    - their Metaphone keys are equal (same consonant skeleton: bad/bed/bit),
+    - their Metaphone keys and spellings are each within max_key_distance /
+      max_spelling_distance edits (affect/effect, and/end), or
+    - their Soundex codes are equal and spellings are within two edits
+      (direction/director)
+
+    key_distances[i][j] holds the Metaphone edit distance, capped at
+    max_key_distance + 1. masks[i] is a bitset of the words confusable with
+    word i, including i itself, so phrase selection is one AND per word.
+
+    Candidate pairs come from symmetric-delete buckets (keys within k edits
+    share a variant with up to k deletions) and from equal Soundex codes,
+    so only those pairs are compared instead of all n^2.
+    """
+
+    def __init__(self, words: Sequence[str], max_key_distance: int = 1, max_spelling_distance: int = 1):
+        """
+        Build the index (~40ms for 373 words)
+
+        Args:
+            words: Wordlist (lowercase)
+            max_key_distance: Metaphone edits still considered confusable
+            max_spelling_distance: Spelling edits required alongside them
+        """
+        self.words = list(words)
+        self.metaphone_keys = [metaphone(word) for word in self.words]
+        self.soundex_keys = [soundex(word) for word in self.words]
+
+        n = len(self.words)
+        cap = max_key_distance + 1
+        self.key_distances = [bytearray([cap]) * n for _ in range(n)]
+        self.masks = [1 << i for i in range(n)]
+
+        buckets: Dict[str, List[int]] = defaultdict(list)
+        for i, key in enumerate(self.metaphone_keys):
+            self.key_distances[i][i] = 0
+            for variant in _deletes(key, max_key_distance):
+                buckets[variant].append(i)
+        candidates = {pair for bucket in buckets.values() for pair in combinations(bucket, 2)}
+
+        for i, j in candidates:
+            distance = edit_distance(self.metaphone_keys[i], self.metaphone_keys[j], max_key_distance)
+            self.key_distances[i][j] = self.key_distances[j][i] = distance
+            if distance == 0 or (
+                distance <= max_key_distance
+                and edit_distance(self.words[i], self.words[j], max_spelling_distance) <= max_spelling_distance
+            ):
+                self._mark(i, j)
+
+        soundex_groups: Dict[str, List[int]] = defaultdict(list)
+        for i, code in enumerate(self.soundex_keys):
+            soundex_groups[code].append(i)
+        for group in soundex_groups.values():
+            for i, j in combinations(group, 2):
+                if edit_distance(self.words[i], self.words[j], 2) <= 2:
+                    self._mark(i, j)
+
+    @classmethod
+    def from_neighbours(cls, words: Sequence[str], neighbours: Callable[[int], Iterable[int]]) -> "PhoneticIndex":
+        """
+        Rebuild an index from stored confusable pairs (see compiled_wordlist)
+
+        Only words and masks are restored; metaphone_keys, soundex_keys and
+        key_distances are None.
+
+        Args:
+            words: Wordlist (kept as given, not copied)
+            neighbours: Indices of the words confusable with word i
+        """
+        index = cls.__new__(cls)
+        index.words = words
+        index.metaphone_keys = index.soundex_keys = index.key_distances = None
+        index.masks = []
+        for i in range(len(words)):
+            mask = 1 << i
+            for j in neighbours(i):
+                mask |= 1 << j
+            index.masks.append(mask)
+        return index
+
+    def _mark(self, i: int, j: int) -> None:
+        self.masks[i] |= 1 << j
+        self.masks[j] |= 1 << i
+
+    def confusable(self, i: int, j: int) -> bool:
+        """Whether words i and j may not share a phrase"""
+        return bool(self.masks[i] >> j & 1)
+
+    def confusable_pairs(self) -> List[Tuple[str, str]]:
+        """Every confusable pair of distinct words"""
+        return [
+            (self.words[i], self.words[j])
+            for i in range(len(self.words)) for j in range(i + 1, len(self.words))
+            if self.masks[i] >> j & 1
+        ]
+
+    @functools.cached_property
+    def max_degree(self) -> int:
+        """Most words any one word excludes from a phrase, itself included"""
+        return max((mask.bit_count() for mask in self.masks), default=1)
+
+    @property
+    def max_word_count(self) -> int:
+        """
+        Longest phrase select() is guaranteed to complete
+
+        Each chosen word excludes at most max_degree words, so after k words
+        at least n - k * max_degree are still allowed.
+        """
+        return (len(self.words) - 1) // self.max_degree + 1 if self.words else 0
+
+    def select(self, draw: Callable[[int], List[int]], count: int, word_count: int) -> List[List[int]]:
+        """
+        Pick phrases whose words are pairwise distinct and not confusable
+
+        Each word is uniform over the words still allowed: draws that hit
+        an excluded word are discarded and the next draw is used.
+
+        Args:
+            draw: Returns that many uniform indices into the wordlist
+            count: Number of phrases
+            word_count: Words per phrase
+
+        Returns:
+            count lists of word indices
+
+        Raises:
+            ValueError: word_count is above max_word_count, so the allowed
+                        words could run out mid-phrase
+        """
+        if word_count > self.max_word_count:
+            raise ValueError(f"Phrases of {word_count} words can't be guaranteed from {len(self.words)} words "
+                             f"(at most {self.max_word_count})")
+        phrases = []
+        pending: List[int] = []
+        for _ in range(count):
+            chosen: List[int] = []
+            excluded = 0
+            while len(chosen) < word_count:
+                if not pending:
+                    # Rejections are rare (a word excludes at most a few
+                    # percent of the list), so ~6% spare draws usually suffice
+                    needed = (count - len(phrases)) * word_count - len(chosen)
+                    pending = draw(needed + needed // 16 + 1)
+                    pending.reverse()
+                index = pending.pop()
+                if excluded >> index & 1:
+                    continue
+                chosen.append(index)
+                excluded |= self.masks[index]
+            phrases.append(chosen)
+        return phrases
+
+    def entropy_report(self, word_count: int, samples: int = 10000) -> Dict[str, Any]:
+        """
+        Guessing resistance of phrases under the confusability constraint
+
+        - unconstrained_bits: word_count independent uniform words
+        - min_bits: guaranteed min-entropy; every step has at least
+          n - step * max_degree allowed words, so no phrase is likelier
+          than the product of their reciprocals
+        - expected_bits: Shannon entropy of the selection process, estimated
+          by sampling (a phrase's probability is the product of 1 / allowed
+          words at each step)
+
+        Args:
+            word_count: Words per phrase
+            samples: Phrases sampled for expected_bits (0 skips it)
+        """
+        n = len(self.words)
+        degrees = [mask.bit_count() for mask in self.masks]
+        max_degree = self.max_degree
+        min_bits = sum(math.log2(max(1, n - step * max_degree)) for step in range(word_count))
+
+        report = {
+            "words": n,
+            "word_count": word_count,
+            "confusable_pairs": (sum(degrees) - n) // 2,
+            "max_confusable": max_degree - 1,
+            "unconstrained_bits": round(word_count * math.log2(n), 2),
+            "min_bits": round(min_bits, 2),
+            "expected_bits": None
+        }
+        if samples:
+            # Statistics only, so the fast non-cryptographic generator is fine
+            rng = random.Random(0)
+            total = 0.0
+            for _ in range(samples):
+                excluded = 0
+                for _ in range(word_count):
+                    total += math.log2(n - bin(excluded).count("1"))
+                    index = rng.randrange(n)
+                    while excluded >> index & 1:
+                        index = rng.randrange(n)
+                    excluded |= self.masks[index]
+            report["expected_bits"] = round(total / samples, 2)
+        return report
+
+
+if __name__ == "__main__":
+    # Build the index for the shipped wordlist and report the entropy cost
+    import time
+
+    with open("diceware.txt", encoding="utf-8") as f:
+        wordlist = [line.strip() for line in f if line.strip()]
+
+    started = time.perf_counter()
+    index = PhoneticIndex(wordlist)
+    print(f"Index for {len(wordlist)} words built in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    for word, expected in (("robert", "R163"), ("rupert", "R163"), ("tymczak", "T522"), ("pfister", "P236")):
+        assert soundex(word) == expected, (word, soundex(word))
+    for word, expected in (("knight", "NT"), ("thumb", "0M"), ("school", "SKL"), ("nation", "NXN")):
+        assert metaphone(word) == expected, (word, metaphone(word))
+
+    pairs = index.confusable_pairs()
+    print(f"{len(pairs)} confusable pairs, e.g. {pairs[:8]}")
+    for word_count in (3, 6):
+        print(index.entropy_report(word_count))
+
+    # Brute-force check of the candidate search against all pairs
+    for i, j in combinations(range(len(wordlist)), 2):
+        full = edit_distance(index.metaphone_keys[i], index.metaphone_keys[j], 1)
+        assert index.key_distances[i][j] == full, (wordlist[i], wordlist[j])
+    print("Symmetric-delete distances match the full pairwise matrix")
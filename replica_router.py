@@ -0,0 +1,210 @@
+"""
+PayShield Replica Router
+Routes PostgreSQL reads to lag-checked read replicas, with read-your-writes
+pinning to the primary
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from circuit_breaker import CircuitBreaker
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Monotonic deadline until which reads in this context go to the primary.
+# Context variables follow the request's task (and tasks it spawns), so one
+# request's write pins only that request's reads.
+_pinned_until: contextvars.ContextVar[float] = contextvars.ContextVar("payshield_pinned_until", default=0.0)
+
+
+class Replica:
+    """One read replica: its pool, health and last measured lag"""
+
+    def __init__(self, url: str, failure_threshold: int = 3, max_backoff: float = 30.0):
+        self.url = url
+        self.pool: Optional[asyncpg.Pool] = None
+        self.breaker = CircuitBreaker(
+            f"replica:{_redact(url)}",
+            failure_threshold=failure_threshold,
+            max_backoff=max_backoff
+        )
+        self.lag_seconds = float("inf")  # Unknown until the first probe
+        self.lag_bytes: Optional[int] = None
+        self.reads = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Replica metrics for health checks"""
+        return {
+            "url": _redact(self.url),
+            "connected": self.pool is not None,
+            "lag_seconds": None if self.lag_seconds == float("inf") else round(self.lag_seconds, 3),
+            "lag_bytes": self.lag_bytes,
+            "reads": self.reads,
+            "circuit": self.breaker.stats()
+        }
+
+
+def _redact(url: str) -> str:
+    """Strip credentials from a connection URL for logging"""
+    scheme, sep, rest = url.partition("://")
+    return f"{scheme}{sep}{rest.rpartition('@')[2]}" if sep else url
+
+
+class ReplicaRouter:
+    """
+    Chooses where a PostgreSQL read runs
+
+    Reads go round-robin to replicas whose measured lag is within max_lag
+    and whose circuit is closed; otherwise, or while the current context is
+    pinned after a write, they go to the primary (choose() returns None).
+    """
+
+    def __init__(self, urls: List[str], max_lag: float = 2.0, pin_seconds: float = 5.0,
+                 probe_interval: float = 1.0, pool_size: int = 10):
+        """
+        Initialize the router
+
+        Args:
+            urls: Replica connection URLs (empty disables routing)
+            max_lag: Replicas further behind than this many seconds get no reads
+            pin_seconds: How long reads stay on the primary after a write
+            probe_interval: Seconds between lag probes
+            pool_size: Maximum connections per replica pool
+        """
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self.pin_seconds = pin_seconds
+        self.probe_interval = probe_interval
+        self.pool_size = pool_size
+
+        self._primary_pool: Optional[asyncpg.Pool] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._next = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+
+    async def start(self, primary_pool: asyncpg.Pool) -> None:
+        """Connect to the replicas, measure their lag and start probing"""
+        if not self.replicas:
+            return
+        self._primary_pool = primary_pool
+        await self.probe()
+        self._probe_task = asyncio.create_task(self._run())
+
+    def pin(self) -> None:
+        """Send this context's reads to the primary for pin_seconds (read-your-writes)"""
+        if self.replicas:
+            _pinned_until.set(time.monotonic() + self.pin_seconds)
+
+    @property
+    def pinned(self) -> bool:
+        """Whether reads in the current context are pinned to the primary"""
+        return _pinned_until.get() > time.monotonic()
+
+    def choose(self) -> Optional[Replica]:
+        """
+        Pick a replica for the next read
+
+        Returns:
+            A replica, or None when the read should go to the primary
+        """
+        if not self.replicas:
+            return None
+        if self.pinned:
+            self.pinned_reads += 1
+            return None
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if replica.pool is None or replica.lag_seconds > self.max_lag:
+                continue
+            if replica.breaker.allow_request():
+                replica.reads += 1
+                return replica
+
+        self.primary_reads += 1
+        return None
+
+    async def probe(self) -> None:
+        """Measure replication lag of every replica against the primary"""
+        try:
+            async with self._primary_pool.acquire() as conn:
+                primary_lsn = await conn.fetchval("SELECT pg_current_wal_lsn()")
+        except Exception as e:
+            logger.warning("⚠️ Could not read primary WAL position: %s", e)
+            return
+
+        await asyncio.gather(*(self._probe_replica(replica, primary_lsn) for replica in self.replicas))
+
+    async def _probe_replica(self, replica: Replica, primary_lsn: int) -> None:
+        try:
+            if replica.pool is None:
+                replica.pool = await asyncpg.create_pool(
+                    replica.url,
+                    min_size=1,
+                    max_size=self.pool_size,
+                    command_timeout=60
+                )
+                logger.info("✅ Read replica connected: %s", _redact(replica.url))
+
+            async with replica.pool.acquire() as conn:
+                row = await conn.fetchrow("""
+                    SELECT pg_is_in_recovery() AS in_recovery,
+                           pg_wal_lsn_diff($1::pg_lsn, pg_last_wal_replay_lsn())::bigint AS lag_bytes,
+                           EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())::float8 AS replay_age
+                """, primary_lsn)
+        except Exception as e:
+            replica.lag_seconds = float("inf")
+            replica.breaker.record_failure()
+            logger.warning("⚠️ Replica probe failed for %s: %s", _redact(replica.url), e)
+            return
+
+        # Reachable again: close the breaker without waiting for a real read
+        replica.breaker.record_success()
+        if not row["in_recovery"]:
+            # Not a standby (e.g. promoted); its data is current
+            replica.lag_bytes, replica.lag_seconds = 0, 0.0
+        else:
+            # Caught up with the primary's WAL position as of this probe: no lag.
+            # Otherwise the age of the last replayed transaction bounds it.
+            replica.lag_bytes = max(0, row["lag_bytes"] or 0)
+            if replica.lag_bytes == 0:
+                replica.lag_seconds = 0.0
+            else:
+                replica.lag_seconds = row["replay_age"] if row["replay_age"] is not None else float("inf")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error("❌ Replica probe loop error: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing metrics for health checks"""
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads
+        }
+
+    async def close(self) -> None:
+        """Stop probing and close the replica pools"""
+        if self._probe_task:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        for replica in self.replicas:
+            if replica.pool:
+                await replica.pool.close()
+                replica.pool = None
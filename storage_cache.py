@@ -0,0 +1,336 @@
+"""
+PayShield Storage Cache Helpers
+Process-local caching primitives used by the Storage Manager
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class LocalTTLCache:
+    """
+    Bounded in-process cache with per-entry TTL and LRU eviction
+
+    Not thread-safe; intended for use from a single event loop.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0):
+        """
+        Initialize the cache
+
+        Args:
+            max_size: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid after it is stored
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Bumped on every invalidation so in-flight loads can detect they raced one
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry when full
+
+        Args:
+            key: Cache key
+            value: Value to store
+            generation: Generation observed before the value was loaded; the
+                value is discarded if an invalidation happened since then
+        """
+        if self.max_size <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry if present"""
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self.generation += 1
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleUseStore:
+    """
+    Bounded in-process store for one-time values with per-entry expiry
+
+    add() never overwrites (like SET NX) and pop() removes while reading
+    (like GETDEL), so each value is handed out at most once. Expired entries
+    are pruned from the oldest end as new ones arrive, so memory stays
+    bounded at high issue rates. Not thread-safe; intended for use from a
+    single event loop.
+    """
+
+    def __init__(self, max_size: int = 100000):
+        """
+        Initialize the store
+
+        Args:
+            max_size: Maximum live entries; the oldest is evicted beyond this
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.evicted = 0
+
+    def add(self, key: Hashable, value: Any, ttl: float) -> bool:
+        """
+        Store a value unless the key is already live
+
+        Returns:
+            False if the key already exists
+        """
+        now = time.monotonic()
+        # Entries are mostly added with the same TTL, so the oldest expire first
+        while self._entries:
+            oldest_key, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[oldest_key]
+
+        if key in self._entries:
+            return False
+        self._entries[key] = (value, now + ttl)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a live value without removing it, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove and return a live value, or None if missing or expired"""
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Per-key request coalescing
+
+    Concurrent callers asking for the same key share one in-flight load
+    instead of each hitting the backing store.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.loads = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run loader for key, or wait for the load already in flight
+
+        The load runs in its own task, so a cancelled caller does not
+        cancel the load for everyone else waiting on it.
+
+        Args:
+            key: Coalescing key
+            loader: Zero-argument coroutine function producing the value
+
+        Returns:
+            The loader's result (exceptions are re-raised to every waiter)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = self.start(key, loader)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def start(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Start a load for key in the background unless one is already running"""
+        task = self._inflight.get(key)
+        if task is not None:
+            return task
+
+        task = asyncio.ensure_future(loader())
+        self._inflight[key] = task
+        self.loads += 1
+
+        def _done(finished: asyncio.Task) -> None:
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            # Mark background-only failures as retrieved; waiters still see them
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(_done)
+        return task
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a load for key is currently running"""
+        return key in self._inflight
+
+
+def jittered_ttl(ttl: int, jitter: float = 0.1) -> int:
+    """
+    Spread a TTL by +/- jitter so keys written together don't expire together
+
+    Args:
+        ttl: Base TTL in seconds
+        jitter: Maximum relative deviation (0.1 = +/-10%)
+
+    Returns:
+        Jittered TTL in whole seconds (at least 1)
+    """
+    return max(1, int(ttl * random.uniform(1 - jitter, 1 + jitter)))
+
+
+def should_refresh_early(remaining_ttl: float, load_seconds: float, beta: float = 1.0) -> bool:
+    """
+    Probabilistic early expiration ("XFetch")
+
+    Each reader independently decides to refresh with a probability that
+    rises as the entry approaches expiry and with how slow a reload is, so
+    one reader refreshes a hot key shortly before it expires instead of all
+    readers missing at once.
+
+    Args:
+        remaining_ttl: Seconds until the cached entry expires
+        load_seconds: Typical time to recompute the entry
+        beta: Values > 1 favour earlier refreshes
+
+    Returns:
+        True if this reader should refresh the entry now
+    """
+    if remaining_ttl <= 0:
+        return True
+    return -load_seconds * beta * math.log(1.0 - random.random()) >= remaining_ttl
+
+
+if __name__ == "__main__":
+    # Test the local cache
+    cache = LocalTTLCache(max_size=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    print(f"LRU eviction: {cache.get('b') is None and cache.get('a') == 1}")
+
+    time.sleep(0.06)
+    print(f"TTL expiry: {cache.get('a') is None}")
+
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.set("a", 1, generation=generation)
+    print(f"Stale load discarded: {cache.get('a') is None}")
+    print(f"Hits: {cache.hits}, misses: {cache.misses}")
+
+    store = SingleUseStore(max_size=2)
+    print(f"Single use: {store.add('x', 1, 1) and not store.add('x', 2, 1) and store.pop('x') == 1 and store.pop('x') is None}")
+    store.add("old", 1, 0.01)
+    time.sleep(0.02)
+    store.add("new", 2, 1)
+    print(f"Expired entries pruned: {len(store) == 1}")
+
+    # Concurrency test: 1000 simultaneous misses on one key
+    async def test_single_flight():
+        flight = SingleFlight()
+        backend_calls = 0
+
+        async def load_from_postgres():
+            nonlocal backend_calls
+            backend_calls += 1
+            await asyncio.sleep(0.05)
+            return {"email": "vendor@example.com"}
+
+        results = await asyncio.gather(*(
+            flight.do("vendor:vendor@example.com", load_from_postgres) for _ in range(1000)
+        ))
+        assert backend_calls == 1, backend_calls
+        assert all(result is results[0] for result in results)
+        assert not flight.in_flight("vendor:vendor@example.com")
+        print(f"1000 concurrent misses -> {backend_calls} backend load, {flight.coalesced} coalesced")
+
+        async def failing_load():
+            await asyncio.sleep(0.01)
+            raise ConnectionError("postgres down")
+
+        outcomes = await asyncio.gather(*(flight.do("k", failing_load) for _ in range(100)), return_exceptions=True)
+        assert all(isinstance(outcome, ConnectionError) for outcome in outcomes)
+        print("Load failure propagated to all 100 waiters")
+
+    asyncio.run(test_single_flight())
+
+    # The same stampede end to end: 1000 concurrent get_vendor_profile misses
+    # (L1 and Redis both empty) on the in-memory backend
+    async def test_storage_manager_stampede():
+        from datetime import datetime, timezone
+        from storage_manager import StorageManager, VendorProfile
+
+        manager = StorageManager(backend="memory")
+        await manager.initialize()
+        email = "stampede@example.com"
+        await manager.store_vendor_profile(VendorProfile(
+            email=email, company_name="Stampede Co", contact_name="Sam",
+            voiceprint_hash="hash", enrollment_date=datetime.now(timezone.utc)
+        ))
+        await manager._invalidate_vendor_profile(email, drop_shared=True)
+
+        loads = 0
+        load_vendor_profile = manager._load_vendor_profile
+
+        async def counted_load(*args, **kwargs):
+            nonlocal loads
+            loads += 1
+            await asyncio.sleep(0.05)  # PostgreSQL round trip
+            return await load_vendor_profile(*args, **kwargs)
+
+        manager._load_vendor_profile = counted_load
+        profiles = await asyncio.gather(*(manager.get_vendor_profile(email) for _ in range(1000)))
+        await manager.close()
+
+        assert loads == 1, loads
+        assert all(profile is not None and profile.contact_name == "Sam" for profile in profiles)
+        print(f"StorageManager: 1000 concurrent get_vendor_profile misses -> {loads} backend load")
+
+    asyncio.run(test_storage_manager_stampede())
+
+    ttls = [jittered_ttl(3600) for _ in range(1000)]
+    print(f"Jittered TTL range: {min(ttls)}-{max(ttls)}s")
+    refreshes = sum(should_refresh_early(1.0, 0.15) for _ in range(10000))
+    print(f"Early refresh rate with 1s left and 150ms loads: {refreshes / 100:.1f}%")
@@ -0,0 +1,321 @@
+"""
+PayShield Storage Metrics
+Latency histograms, cache hit ratios and pool statistics for the storage
+layer, with Prometheus text exposition
+"""
+
+import bisect
+import functools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+# Upper bounds in seconds; observations above the last bound land in +Inf
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram
+
+    Observing is O(log buckets) with no allocation, so it is cheap enough
+    for every request. Quantiles are estimated by linear interpolation
+    inside the bucket that contains them.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Initialize the histogram
+
+        Args:
+            buckets: Sorted bucket upper bounds in seconds
+        """
+        self.bounds: List[float] = list(buckets)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one latency"""
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Record the wall time of the with-block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile in seconds
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            Estimated latency (0.0 with no observations; the last bound for the +Inf bucket)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+    def prometheus_lines(self, name: str, labels: str) -> List[str]:
+        """
+        Prometheus histogram samples (cumulative buckets, sum, count)
+
+        Args:
+            name: Metric name without suffix
+            labels: Rendered label pairs, e.g. 'method="get_vendor_profile"'
+        """
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+    def stats(self) -> Dict[str, Any]:
+        """Count, mean and percentiles in milliseconds"""
+        mean = self.sum / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": round(mean * 1000, 3),
+            "p50_ms": round(self.quantile(0.50) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3)
+        }
+
+
+class StorageMetrics:
+    """
+    Metrics registry for one StorageManager
+
+    - method latency: end to end per public method
+    - backend latency: time spent in Redis / PostgreSQL per operation kind
+      (PostgreSQL excludes the pool wait; a Redis command takes its
+      connection internally, so there it is included)
+    - pool wait: time to acquire a connection, per pool
+    - cache lookups: hits and misses per layer (l1, redis) and key family
+    """
+
+    def __init__(self):
+        self.methods: Dict[str, LatencyHistogram] = {}
+        self.backends: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.pool_waits: Dict[str, LatencyHistogram] = {}
+        self.cache: Dict[Tuple[str, str], List[int]] = {}
+
+    def method(self, name: str) -> LatencyHistogram:
+        """Histogram for a public method"""
+        histogram = self.methods.get(name)
+        if histogram is None:
+            histogram = self.methods[name] = LatencyHistogram()
+        return histogram
+
+    def backend(self, backend: str, operation: str) -> LatencyHistogram:
+        """Histogram for backend time, e.g. ("postgres", "read")"""
+        key = (backend, operation)
+        histogram = self.backends.get(key)
+        if histogram is None:
+            histogram = self.backends[key] = LatencyHistogram()
+        return histogram
+
+    def pool_wait(self, pool: str) -> LatencyHistogram:
+        """Histogram for connection acquire waits on a pool"""
+        histogram = self.pool_waits.get(pool)
+        if histogram is None:
+            histogram = self.pool_waits[pool] = LatencyHistogram()
+        return histogram
+
+    def record_cache(self, layer: str, family: str, hit: bool) -> None:
+        """Count one cache lookup"""
+        counts = self.cache.get((layer, family))
+        if counts is None:
+            counts = self.cache[(layer, family)] = [0, 0]
+        counts[0 if hit else 1] += 1
+
+    def snapshot(self, pools: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Summary for health checks
+
+        Args:
+            pools: Current utilisation per pool (see pool_stats)
+        """
+        cache = {}
+        for (layer, family), (hits, misses) in self.cache.items():
+            total = hits + misses
+            cache[f"{layer}:{family}"] = {
+                "hits": hits, "misses": misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0
+            }
+        return {
+            "methods": {name: h.stats() for name, h in self.methods.items()},
+            "backends": {f"{b}:{op}": h.stats() for (b, op), h in self.backends.items()},
+            "pools": {
+                name: {**stats, "wait": self.pool_wait(name).stats()} for name, stats in pools.items()
+            },
+            "cache": cache
+        }
+
+    def prometheus(self, pools: Dict[str, Dict[str, Any]], prefix: str = "payshield_storage") -> str:
+        """
+        Render everything in the Prometheus text exposition format
+
+        Args:
+            pools: Current utilisation per pool (see pool_stats)
+            prefix: Metric name prefix
+        """
+        lines: List[str] = []
+
+        def histogram_family(name: str, help_text: str, series: List[Tuple[str, LatencyHistogram]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series:
+                lines.extend(histogram.prometheus_lines(name, labels))
+
+        histogram_family(
+            f"{prefix}_method_seconds", "End-to-end latency of StorageManager methods",
+            [(f'method="{name}"', h) for name, h in sorted(self.methods.items())]
+        )
+        histogram_family(
+            f"{prefix}_backend_seconds", "Time spent in storage backend calls",
+            [(f'backend="{b}",operation="{op}"', h) for (b, op), h in sorted(self.backends.items())]
+        )
+        histogram_family(
+            f"{prefix}_pool_wait_seconds", "Time waiting to acquire a pooled connection",
+            [(f'pool="{name}"', self.pool_wait(name)) for name in sorted(pools)]
+        )
+
+        lines.append(f"# HELP {prefix}_cache_lookups_total Cache lookups by layer, key family and result")
+        lines.append(f"# TYPE {prefix}_cache_lookups_total counter")
+        for (layer, family), (hits, misses) in sorted(self.cache.items()):
+            lines.append(f'{prefix}_cache_lookups_total{{layer="{layer}",family="{family}",result="hit"}} {hits}')
+            lines.append(f'{prefix}_cache_lookups_total{{layer="{layer}",family="{family}",result="miss"}} {misses}')
+
+        lines.append(f"# HELP {prefix}_pool_connections Pooled connections by state")
+        lines.append(f"# TYPE {prefix}_pool_connections gauge")
+        for name, stats in sorted(pools.items()):
+            for state in ("in_use", "idle", "max"):
+                if stats.get(state) is not None:
+                    lines.append(f'{prefix}_pool_connections{{pool="{name}",state="{state}"}} {stats[state]}')
+
+        lines.append(f"# HELP {prefix}_pool_utilisation In-use connections as a fraction of the pool maximum")
+        lines.append(f"# TYPE {prefix}_pool_utilisation gauge")
+        for name, stats in sorted(pools.items()):
+            if stats.get("utilisation") is not None:
+                lines.append(f'{prefix}_pool_utilisation{{pool="{name}"}} {stats["utilisation"]}')
+
+        return "\n".join(lines) + "\n"
+
+
+def instrumented(method: Callable) -> Callable:
+    """Record an async StorageManager method's latency in self.metrics"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        with self.metrics.method(name).time():
+            return await method(self, *args, **kwargs)
+    return wrapper
+
+
+def pool_stats(in_use: int, idle: Optional[int], max_size: Optional[int]) -> Dict[str, Any]:
+    """Utilisation summary for one pool"""
+    return {
+        "in_use": in_use,
+        "idle": idle,
+        "max": max_size,
+        "utilisation": round(in_use / max_size, 4) if max_size else None
+    }
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """Redis blocking pool that records how long callers wait for a connection"""
+
+    wait_histogram: Optional[LatencyHistogram] = None
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        connection = await super().get_connection(*args, **kwargs)
+        if self.wait_histogram is not None:
+            self.wait_histogram.observe(time.perf_counter() - started)
+        return connection
+
+    def stats(self) -> Dict[str, Any]:
+        """Current utilisation"""
+        return pool_stats(len(self._in_use_connections), len(self._available_connections), self.max_connections)
+
+
+class InstrumentedPool:
+    """
+    Wrapper around a PostgreSQL pool that records acquire waits and tracks
+    connections in use; everything else is delegated to the wrapped pool
+    """
+
+    def __init__(self, pool, wait_histogram: LatencyHistogram):
+        self._pool = pool
+        self.wait_histogram = wait_histogram
+        self.in_use = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        started = time.perf_counter()
+        async with self._pool.acquire() as conn:
+            self.wait_histogram.observe(time.perf_counter() - started)
+            self.in_use += 1
+            try:
+                yield conn
+            finally:
+                self.in_use -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current utilisation (size figures only when the pool reports them)"""
+        idle = max_size = None
+        if hasattr(self._pool, "get_max_size"):
+            idle = self._pool.get_idle_size()
+            max_size = self._pool.get_max_size()
+        return pool_stats(self.in_use, idle, max_size)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+
+if __name__ == "__main__":
+    # Test the histogram against exact percentiles
+    import random
+
+    samples = [random.lognormvariate(-5, 0.8) for _ in range(100000)]
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.observe(sample)
+
+    samples.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = samples[int(q * len(samples)) - 1]
+        print(f"p{int(q * 100)}: estimated {histogram.quantile(q) * 1000:.2f}ms, exact {exact * 1000:.2f}ms")
+
+    started = time.perf_counter()
+    for sample in samples:
+        histogram.observe(sample)
+    print(f"observe(): {(time.perf_counter() - started) / len(samples) * 1e9:.0f}ns")
+    print(histogram.stats())
@@ -0,0 +1,329 @@
+"""
+PayShield Storage Statements
+Registry of named SQL statements, prepared once per pooled connection
+through asyncpg's statement cache
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import asyncpg
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Columns selected for each dataclass in storage_manager, named after its
+# fields so rows decode by name: VendorProfile(**row), OAuthToken(**row),
+# VerificationAttempt(**row)
+VENDOR_FIELDS = ("email", "company_name", "contact_name", "voiceprint_hash", "enrollment_date",
+                 "last_verification", "verification_count", "confidence_threshold", "expires_at")
+OAUTH_FIELDS = ("user_email", "access_token", "refresh_token", "expires_at", "scope", "created_at")
+ATTEMPT_FIELDS = ("id", "vendor_email", "thread_id", "challenge_words", "confidence_score",
+                  "success", "timestamp", "ip_address", "user_agent")
+
+VENDOR_COLUMNS = ", ".join(VENDOR_FIELDS)
+OAUTH_COLUMNS = ", ".join(OAUTH_FIELDS)
+ATTEMPT_COLUMNS = ", ".join(
+    "host(ip_address) AS ip_address" if field == "ip_address" else field for field in ATTEMPT_FIELDS
+)
+
+STATEMENTS: Dict[str, str] = {
+    "oauth_upsert": """
+        INSERT INTO oauth_tokens
+        (user_email, access_token, refresh_token, expires_at, scope, updated_at)
+        VALUES ($1, $2, $3, $4, $5, NOW())
+        ON CONFLICT (user_email) DO UPDATE SET
+            access_token = EXCLUDED.access_token,
+            refresh_token = EXCLUDED.refresh_token,
+            expires_at = EXCLUDED.expires_at,
+            scope = EXCLUDED.scope,
+            updated_at = NOW()
+    """,
+    # Retention batches: lock the batch's rows (skipping rows other
+    # transactions hold) through the expires_at index, then delete by ctid
+    "oauth_delete_expired": """
+        DELETE FROM oauth_tokens
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM oauth_tokens
+            WHERE expires_at < NOW()
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING user_email
+    """,
+    "oauth_get": f"""
+        SELECT {OAUTH_COLUMNS} FROM oauth_tokens
+        WHERE user_email = $1 AND expires_at > NOW()
+    """,
+    # verification_count is only set on insert: afterwards vendor_fold_counts
+    # owns it, so a read-modify-write of a profile (whose count includes
+    # unfolded increments) can't store them a second time
+    "vendor_upsert": """
+        INSERT INTO vendor_profiles
+        (email, company_name, contact_name, voiceprint_hash,
+         enrollment_date, verification_count, confidence_threshold, expires_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW())
+        ON CONFLICT (email) DO UPDATE SET
+            company_name = EXCLUDED.company_name,
+            contact_name = EXCLUDED.contact_name,
+            voiceprint_hash = EXCLUDED.voiceprint_hash,
+            enrollment_date = EXCLUDED.enrollment_date,
+            confidence_threshold = EXCLUDED.confidence_threshold,
+            expires_at = EXCLUDED.expires_at,
+            updated_at = NOW()
+        RETURNING verification_count
+    """,
+    "vendor_get": f"""
+        SELECT {VENDOR_COLUMNS} FROM vendor_profiles
+        WHERE email = $1 AND expires_at > NOW()
+    """,
+    "vendor_delete_expired": """
+        DELETE FROM vendor_profiles
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM vendor_profiles
+            WHERE expires_at < NOW()
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING email
+    """,
+    # last_verification is the latest folded success (GREATEST skips NULLs),
+    # not the time of the fold, and never moves backwards
+    "vendor_fold_counts": """
+        UPDATE vendor_profiles AS v
+        SET verification_count = v.verification_count + d.n,
+            last_verification = GREATEST(v.last_verification, d.at),
+            updated_at = NOW()
+        FROM unnest($1::varchar[], $2::int[], $3::timestamptz[]) AS d(email, n, at)
+        WHERE v.email = d.email
+    """,
+    "attempt_insert": """
+        INSERT INTO verification_attempts
+        (id, vendor_email, thread_id, challenge_words, confidence_score,
+         success, timestamp, ip_address, user_agent)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+        ON CONFLICT DO NOTHING
+    """,
+    # ctid is only unique within one partition, so attempts go by primary key
+    "attempt_delete_before": """
+        WITH batch AS (
+            SELECT id, timestamp FROM verification_attempts
+            WHERE timestamp < $1
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        DELETE FROM verification_attempts AS a
+        USING batch
+        WHERE a.id = batch.id AND a.timestamp = batch.timestamp
+        RETURNING a.id
+    """,
+    "history_latest": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1
+        ORDER BY timestamp DESC
+        LIMIT $2
+    """,
+    "history_since": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1 AND timestamp >= $3
+        ORDER BY timestamp DESC
+        LIMIT $2
+    """,
+    "history_page_first": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1
+        ORDER BY timestamp DESC, id DESC
+        LIMIT $2
+    """,
+    "history_page_after": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1 AND (timestamp, id) < ($3, $4)
+        ORDER BY timestamp DESC, id DESC
+        LIMIT $2
+    """,
+    "history_stream": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1
+        ORDER BY timestamp DESC, id DESC
+    """,
+    "history_stream_since": f"""
+        SELECT {ATTEMPT_COLUMNS} FROM verification_attempts
+        WHERE vendor_email = $1 AND timestamp >= $2
+        ORDER BY timestamp DESC, id DESC
+    """,
+    "ping": "SELECT 1",
+    # Cleanup transactions: bounded lock waits, with the table lock taken
+    # explicitly so its wait can be measured on its own
+    "set_lock_timeout": "SELECT set_config('lock_timeout', $1, true)",
+    "oauth_lock": "LOCK TABLE oauth_tokens IN ROW EXCLUSIVE MODE",
+    "vendor_lock": "LOCK TABLE vendor_profiles IN ROW EXCLUSIVE MODE",
+    "attempt_lock": "LOCK TABLE verification_attempts IN ROW EXCLUSIVE MODE",
+}
+
+# Statements safe to run on a read replica
+READ_STATEMENTS = (
+    "ping", "oauth_get", "vendor_get", "history_latest", "history_since",
+    "history_page_first", "history_page_after", "history_stream", "history_stream_since",
+)
+
+
+class BoundStatement:
+    """
+    A registered statement on one connection
+
+    Runs through asyncpg's per-connection statement cache (statement_cache_size,
+    100 by default, well above len(STATEMENTS)), so each statement is prepared
+    on first use per connection and its server-side plan reused afterwards;
+    statement_cache_stats() shows which are prepared on a connection.
+
+    Statements are not prepared up front in the pool's init hook: the
+    PreparedStatement handles it would create are invalidated on every release
+    to the pool, and Connection.prepare() bypasses the statement cache, so
+    first use is the earliest the cache can be filled through public API.
+    """
+
+    __slots__ = ("_conn", "_sql")
+
+    def __init__(self, conn, sql: str):
+        self._conn = conn
+        self._sql = sql
+
+    async def fetch(self, *args) -> List[asyncpg.Record]:
+        return await self._conn.fetch(self._sql, *args)
+
+    async def fetchrow(self, *args) -> Optional[asyncpg.Record]:
+        return await self._conn.fetchrow(self._sql, *args)
+
+    async def fetchval(self, *args) -> Any:
+        return await self._conn.fetchval(self._sql, *args)
+
+    async def executemany(self, args: Iterable[Sequence]) -> None:
+        await self._conn.executemany(self._sql, args)
+
+    def cursor(self, *args, prefetch: Optional[int] = None):
+        return self._conn.cursor(self._sql, *args, prefetch=prefetch)
+
+
+async def check_statements(conn: asyncpg.Connection) -> None:
+    """
+    Prepare (and discard) every registered statement once at startup
+
+    Catches SQL that no longer matches the schema before the first request
+    hits it. Run after the schema is created.
+    """
+    for name, sql in STATEMENTS.items():
+        try:
+            await conn.prepare(sql)
+        except asyncpg.PostgresError as e:
+            raise RuntimeError(f"Statement {name!r} does not match the schema: {e}") from e
+
+
+async def statement_cache_stats(conn: asyncpg.Connection) -> Dict[str, Dict[str, int]]:
+    """
+    Registered statements currently prepared on a connection's session
+
+    Read from pg_prepared_statements, so it reflects what the server holds:
+    a registered statement missing here is prepared (a cache miss) on its
+    next use, and every execution after that reuses the plan (a hit).
+
+    Args:
+        conn: asyncpg connection (or pool proxy)
+
+    Returns:
+        {name: {"executions": n, "generic_plans": n, "custom_plans": n}}
+        for each registered statement prepared on the connection
+    """
+    names = {sql: name for name, sql in STATEMENTS.items()}
+    stats = {}
+    for row in await conn.fetch("SELECT statement, generic_plans, custom_plans FROM pg_prepared_statements"):
+        name = names.get(row["statement"])
+        if name is not None:
+            stats[name] = {
+                "executions": row["generic_plans"] + row["custom_plans"],
+                "generic_plans": row["generic_plans"],
+                "custom_plans": row["custom_plans"],
+            }
+    return stats
+
+
+def statement(conn, name: str) -> BoundStatement:
+    """
+    Look up a registered statement on a pooled connection
+
+    Args:
+        conn: asyncpg connection (or pool proxy), or any backend connection
+              that implements statement(name)
+        name: Key in STATEMENTS
+
+    Returns:
+        Object with fetch/fetchrow/fetchval/executemany/cursor for the statement
+    """
+    own = getattr(conn, "statement", None)
+    if own is not None:
+        return own(name)
+    return BoundStatement(conn, STATEMENTS[name])
+
+
+if __name__ == "__main__":
+    # Benchmark: registered statements (prepared once per connection, through
+    # the statement cache) against the same SQL on a connection without a
+    # statement cache, which parses and plans every call. Needs DATABASE_URL.
+    import asyncio
+    import os
+    import time
+    import uuid
+    from datetime import datetime, timezone
+
+    from storage_manager import StorageManager, VendorProfile
+
+    async def benchmark():
+        manager = StorageManager()
+        await manager.initialize()
+
+        email = "bench-vendor@example.com"
+        await manager.store_vendor_profile(VendorProfile(
+            email=email,
+            company_name="Bench Co",
+            contact_name="Bench",
+            voiceprint_hash="bench",
+            enrollment_date=datetime.now(timezone.utc)
+        ))
+
+        def attempt_args():
+            return (str(uuid.uuid4()), email, "bench-thread", "able about account",
+                    95.0, True, datetime.now(timezone.utc), "203.0.113.7", "bench")
+
+        iterations = int(os.getenv("BENCH_ITERATIONS", "2000"))
+        uncached = await asyncpg.connect(manager.postgres_url, statement_cache_size=0)
+        async with manager.postgres_pool.acquire() as conn:
+            cases = {
+                "get_vendor_profile": (
+                    lambda: uncached.fetchrow(STATEMENTS["vendor_get"], email),
+                    lambda: statement(conn, "vendor_get").fetchrow(email),
+                ),
+                "log_verification_attempt": (
+                    lambda: uncached.fetch(STATEMENTS["attempt_insert"], *attempt_args()),
+                    lambda: statement(conn, "attempt_insert").fetch(*attempt_args()),
+                ),
+            }
+            for label, (inline, registered) in cases.items():
+                timings = {}
+                for variant, call in (("uncached", inline), ("registry", registered)):
+                    for _ in range(50):
+                        await call()
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        await call()
+                    timings[variant] = (time.perf_counter() - started) / iterations * 1e6
+                    print(f"{label:26s} {variant:9s} {timings[variant]:8.1f} µs/call")
+                print(f"{label:26s} registry is {timings['uncached'] / timings['registry']:.2f}x the uncached rate")
+
+            cached = await statement_cache_stats(conn)
+            print(f"Prepared on the pooled connection: {len(cached)} of {len(STATEMENTS)} registered statements")
+            for name, counts in sorted(cached.items()):
+                print(f"  {name:24s} {counts}")
+        await uncached.close()
+
+        await manager.close()
+
+    asyncio.run(benchmark())
@@ -0,0 +1,167 @@
+"""
+PayShield Streaming Transcriber
+Incremental speech-to-text for audio streamed while the vendor is speaking
+"""
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+try:
+    from assemblyai.streaming.v3 import (
+        StreamingClient, StreamingClientOptions, StreamingEvents, StreamingParameters
+    )
+except ImportError:  # only AssemblyAITranscriber needs the SDK; the stub runs anywhere
+    StreamingClient = None
+
+# Frames are 16-bit little-endian PCM, mono
+DEFAULT_SAMPLE_RATE = 16000
+
+
+@dataclass
+class TranscriptEvent:
+    """
+    Transcript update for the current turn
+
+    Partial events for a turn replace each other; a final event ends the
+    turn and the next event starts a new one.
+    """
+    text: str
+    is_final: bool
+
+
+class StreamingTranscriber(ABC):
+    """
+    Interface for streaming speech-to-text engines
+
+    stream() consumes audio frames as they arrive and yields transcript
+    events. Closing the returned generator early (e.g. once the challenge
+    phrase has been heard) stops the session and releases the connection.
+    """
+
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+
+    @abstractmethod
+    async def stream(self, frames: AsyncIterator[bytes]) -> AsyncIterator[TranscriptEvent]:
+        """
+        Transcribe frames as they arrive (implemented as an async generator)
+
+        Args:
+            frames: PCM16 mono audio frames; the iterator ends when the audio does
+
+        Yields:
+            Transcript events
+        """
+        yield  # an async generator, like the implementations
+
+
+class AssemblyAITranscriber(StreamingTranscriber):
+    """
+    AssemblyAI Universal-Streaming (v3 realtime API)
+
+    The SDK client is blocking and calls back on its own thread, so frames
+    are sent from worker threads and events are handed back to the event
+    loop through a queue.
+    """
+
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, api_key: Optional[str] = None,
+                 api_host: str = "streaming.assemblyai.com"):
+        """
+        Initialize the transcriber
+
+        Args:
+            sample_rate: Sample rate of the frames
+            api_key: AssemblyAI key; defaults to ASSEMBLYAI_API_KEY
+            api_host: Streaming API host
+        """
+        if StreamingClient is None:
+            raise RuntimeError("assemblyai is required for streaming transcription (pip install assemblyai)")
+        super().__init__(sample_rate)
+        self.api_key = api_key or os.getenv("ASSEMBLYAI_API_KEY")
+        self.api_host = api_host
+
+    async def stream(self, frames: AsyncIterator[bytes]) -> AsyncIterator[TranscriptEvent]:
+        loop = asyncio.get_running_loop()
+        # TranscriptEvent, an exception to raise, or None once the session ends
+        events: asyncio.Queue = asyncio.Queue()
+
+        def deliver(item) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, item)
+
+        client = StreamingClient(StreamingClientOptions(api_key=self.api_key, api_host=self.api_host))
+        client.on(StreamingEvents.Turn, lambda _, event: deliver(TranscriptEvent(event.transcript, event.end_of_turn)))
+        client.on(StreamingEvents.Error, lambda _, error: deliver(RuntimeError(f"Streaming transcription failed: {error}")))
+        client.on(StreamingEvents.Termination, lambda _, event: deliver(None))
+        await asyncio.to_thread(client.connect, StreamingParameters(sample_rate=self.sample_rate))
+
+        disconnected = False
+
+        async def send() -> None:
+            nonlocal disconnected
+            try:
+                async for frame in frames:
+                    await asyncio.to_thread(client.stream, frame)
+                # End of audio: flush the last turn and end the session
+                disconnected = True
+                await asyncio.to_thread(client.disconnect, True)
+            except Exception as e:
+                deliver(e)
+            deliver(None)
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            sender.cancel()
+            if not disconnected:
+                await asyncio.to_thread(client.disconnect, True)
+
+
+class StubTranscriber(StreamingTranscriber):
+    """
+    Local stand-in for tests and development
+
+    "Hears" a fixed transcript one word per bytes_per_word of audio
+    received, emitting cumulative partial events like a realtime engine.
+    When the audio ends, a final event flushes the word in progress.
+    """
+
+    def __init__(self, transcript: str, bytes_per_word: int = 6400, latency: float = 0.0,
+                 sample_rate: int = DEFAULT_SAMPLE_RATE):
+        """
+        Initialize the stub
+
+        Args:
+            transcript: Text the stub will recognise
+            bytes_per_word: Audio per word (6400 bytes is 200ms of 16kHz PCM16)
+            latency: Seconds to wait before each event, to simulate the engine
+            sample_rate: Sample rate of the frames
+        """
+        super().__init__(sample_rate)
+        self.words = transcript.split()
+        self.bytes_per_word = bytes_per_word
+        self.latency = latency
+
+    async def stream(self, frames: AsyncIterator[bytes]) -> AsyncIterator[TranscriptEvent]:
+        heard = received = 0
+        async for frame in frames:
+            received += len(frame)
+            count = min(len(self.words), received // self.bytes_per_word)
+            if count > heard:
+                heard = count
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                yield TranscriptEvent(" ".join(self.words[:heard]), False)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        spoken = min(len(self.words), -(-received // self.bytes_per_word))
+        yield TranscriptEvent(" ".join(self.words[:spoken]), True)
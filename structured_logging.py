@@ -0,0 +1,256 @@
+"""
+PayShield Structured Logging
+Lazy, sampled logging with structured fields, written off the event loop
+through a queue
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, TextIO
+
+# Per-logger sample rates for INFO and DEBUG records (warnings and errors are
+# never sampled). Looked up when a record is emitted, so loggers created at
+# import time pick up configure_logging() settings.
+_sample_rates: Dict[str, float] = {}
+_default_sample_rate = 1.0
+_listener: Optional[QueueListener] = None
+
+
+class StructuredLogger:
+    """
+    Facade over a stdlib logger
+
+    Messages use %-style placeholders and are only formatted when the
+    record is actually written, on the listener thread. Keyword arguments
+    become structured fields:
+
+        logger.info("✅ Vendor profile stored for %s", email, source="api")
+
+    A disabled level costs one cached isEnabledFor() check. Arguments are
+    formatted later on another thread, so pass values that won't be
+    mutated afterwards (strings, numbers).
+    """
+
+    __slots__ = ("name", "_logger")
+
+    def __init__(self, logger: logging.Logger):
+        self.name = logger.name
+        self._logger = logger
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg: str, *args: Any, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, fields)
+
+    def exception(self, msg: str, *args: Any, **fields: Any) -> None:
+        """Log at ERROR with the current exception's traceback"""
+        if self._logger.isEnabledFor(logging.ERROR):
+            fields.setdefault("exc_info", True)
+            self._log(logging.ERROR, msg, args, fields)
+
+    def _log(self, level: int, msg: str, args: tuple, fields: Dict[str, Any]) -> None:
+        if level < logging.WARNING:
+            rate = _sample_rates.get(self.name, _default_sample_rate)
+            if rate < 1.0 and random.random() >= rate:
+                return
+        exc_info = fields.pop("exc_info", None)
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        # Built directly rather than through Logger.log, which walks the stack
+        # for the caller's file and line; no PayShield format prints them
+        record = self._logger.makeRecord(
+            self.name, level, "(unknown file)", 0, msg, args, exc_info,
+            extra={"fields": fields} if fields else None
+        )
+        self._logger.handle(record)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger for a module (use __name__)"""
+    return StructuredLogger(logging.getLogger(name))
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Text ("... key=value") or JSON-lines output including structured fields
+    """
+
+    def __init__(self, json_output: bool = False):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None)
+        if not self.json_output:
+            text = super().format(record)
+            if fields:
+                text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+            return text
+
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread
+
+    The stdlib handler formats every record in the calling thread before
+    enqueueing it. Only tracebacks are rendered here, while the frames they
+    reference are still intact.
+    """
+
+    _traceback_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: Optional[str] = None, json_output: Optional[bool] = None,
+                      sample_rates: Optional[Dict[str, float]] = None,
+                      stream: Optional[TextIO] = None) -> None:
+    """
+    Route all logging through a queue to a single writer thread
+
+    Replaces any handlers on the root logger, so it is safe to call again
+    (e.g. from tests) and replaces logging.basicConfig in entry points.
+
+    Args:
+        level: Root level name; defaults to LOG_LEVEL (INFO)
+        json_output: JSON lines instead of text; defaults to LOG_FORMAT=json
+        sample_rates: Fraction of INFO/DEBUG records kept per logger name,
+                      "*" for the default; defaults to LOG_SAMPLE_RATES
+                      ("storage_manager=0.1,*=1")
+        stream: Output stream (stderr by default)
+    """
+    global _listener, _default_sample_rate
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_output is None:
+        json_output = os.getenv("LOG_FORMAT", "text").lower() == "json"
+    if sample_rates is None:
+        sample_rates = {}
+        for item in os.getenv("LOG_SAMPLE_RATES", "").split(","):
+            name, sep, rate = item.partition("=")
+            if sep:
+                sample_rates[name.strip()] = float(rate)
+
+    stop_logging()
+    _sample_rates.clear()
+    _sample_rates.update(sample_rates)
+    _default_sample_rate = _sample_rates.pop("*", 1.0)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_output))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+        existing.close()
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+if __name__ == "__main__":
+    # Benchmark: caller-thread CPU per log call, old style vs the facade
+    import time
+
+    N = 100000
+    email = "vendor@example.com"
+    devnull = open(os.devnull, "w")
+
+    def cpu_per_call(fn) -> float:
+        started = time.thread_time()
+        for _ in range(N):
+            fn()
+        return (time.thread_time() - started) / N * 1e9
+
+    # Old setup: basicConfig handler formatting and writing on the caller's thread
+    plain = logging.getLogger("bench.plain")
+    structured = get_logger("bench.structured")
+    root = logging.getLogger()
+    results = {}
+
+    def eager_setup(level):
+        stop_logging()
+        root.handlers[:] = [logging.StreamHandler(devnull)]
+        root.setLevel(level)
+
+    eager_setup(logging.INFO)
+    results["INFO, f-string, basicConfig handler"] = cpu_per_call(
+        lambda: plain.info(f"✅ Vendor profile stored for {email}")
+    )
+    eager_setup(logging.WARNING)
+    results["WARNING, f-string (disabled call)"] = cpu_per_call(
+        lambda: plain.info(f"✅ Vendor profile stored for {email}")
+    )
+
+    configure_logging("INFO", stream=devnull)
+    results["INFO, facade, queued"] = cpu_per_call(
+        lambda: structured.info("✅ Vendor profile stored for %s", email)
+    )
+    configure_logging("INFO", stream=devnull, sample_rates={"bench.structured": 0.1})
+    results["INFO, facade, queued, 10% sampled"] = cpu_per_call(
+        lambda: structured.info("✅ Vendor profile stored for %s", email)
+    )
+    configure_logging("WARNING", stream=devnull)
+    results["WARNING, facade (disabled call)"] = cpu_per_call(
+        lambda: structured.info("✅ Vendor profile stored for %s", email)
+    )
+    stop_logging()
+
+    # A verification request logs ~6 INFO lines (challenge, storage, badge, draft)
+    baseline = results["INFO, f-string, basicConfig handler"]
+    for name, ns in results.items():
+        print(f"{name:40s} {ns:>7,.0f}ns/call  {ns * 6 / 1000:>6.2f}µs/request  "
+              f"({baseline / ns:.1f}x less CPU than the old setup)")
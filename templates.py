@@ -1561,12 +1561,13 @@ VERIFICATION_MODAL_TEMPLATE = """
                     <h4 style="color: var(--text-primary); margin-bottom: var(--space-md); font-weight: 600;">Challenge Phrase:</h4>
                     <div style="font-size: var(--text-lg); font-weight: 600; color: var(--accent); font-family: 'JetBrains Mono', monospace;">
                         {% for word in challenge_words %}
-                        <span style="margin: 0 var(--space-sm); padding: var(--space-sm) var(--space-md); background: var(--background-elevated); border-radius: var(--radius-sm); display: inline-block; margin-bottom: var(--space-sm); border: 1px solid var(--border);">{{ word }}</span>
+                        <span class="challenge-word" style="margin: 0 var(--space-sm); padding: var(--space-sm) var(--space-md); background: var(--background-elevated); border-radius: var(--radius-sm); display: inline-block; margin-bottom: var(--space-sm); border: 1px solid var(--border);">{{ word }}</span>
                         {% endfor %}
                     </div>
                     <p style="color: var(--text-secondary); font-size: var(--text-sm); margin-top: var(--space-md);">
                         Speak naturally at normal volume. The verification will complete automatically.
                     </p>
+                    <p id="live-transcript" style="color: var(--text-secondary); font-size: var(--text-sm); margin-top: var(--space-sm); min-height: 1.5em; font-style: italic;"></p>
                 </div>
                 
                 <div style="display: flex; gap: var(--space-md); justify-content: center; flex-wrap: wrap;">
@@ -1616,56 +1617,152 @@ function closeModal() {
     }
 }
 
-// Enhanced voice recording logic
-let mediaRecorder;
-let audioChunks = [];
+// Streaming voice capture: 16-bit PCM frames go to the server over a
+// WebSocket while the vendor speaks, and the server answers as soon as the
+// last challenge word is heard
+// Replaced by the server's follow-up challenge after a failed attempt
+let challengeId = "{{ challenge_id }}";
+const WORD_THRESHOLD = 0.75;
+
+// Runs on the audio thread; posts 100ms frames of mono PCM16
+const PCM_WORKLET = `
+class Pcm16Frames extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        this.frame = new Int16Array(Math.round(sampleRate / 10));
+        this.filled = 0;
+    }
+    process(inputs) {
+        const channel = inputs[0][0];
+        if (channel) {
+            for (let i = 0; i < channel.length; i++) {
+                const sample = Math.max(-1, Math.min(1, channel[i]));
+                this.frame[this.filled++] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+                if (this.filled === this.frame.length) {
+                    this.port.postMessage(this.frame.buffer, [this.frame.buffer]);
+                    this.frame = new Int16Array(this.frame.length);
+                    this.filled = 0;
+                }
+            }
+        }
+        return true;
+    }
+}
+registerProcessor('pcm16-frames', Pcm16Frames);
+`;
+
+let audioContext;
+let mediaStream;
+let workletNode;
+let socket;
+let autoStop;
 
 document.getElementById('start-recording').addEventListener('click', async function() {
     try {
-        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-        mediaRecorder = new MediaRecorder(stream);
-        
-        this.style.display = 'none';
-        document.getElementById('stop-recording').style.display = 'inline-flex';
-        document.getElementById('recording-status').style.display = 'block';
+        mediaStream = await navigator.mediaDevices.getUserMedia({
+            audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+        });
+        // Browsers resample the microphone to the context rate
+        audioContext = new AudioContext({ sampleRate: 16000 });
+        const workletUrl = URL.createObjectURL(new Blob([PCM_WORKLET], { type: 'application/javascript' }));
+        await audioContext.audioWorklet.addModule(workletUrl);
+        URL.revokeObjectURL(workletUrl);
         
-        mediaRecorder.ondataavailable = event => {
-            audioChunks.push(event.data);
-        };
+        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+        socket = new WebSocket(`${scheme}://${location.host}/ws/verify/${challengeId}?sample_rate=${audioContext.sampleRate}`);
+        socket.binaryType = 'arraybuffer';
+        socket.onmessage = event => handleMessage(JSON.parse(event.data));
+        await new Promise((resolve, reject) => {
+            socket.onopen = resolve;
+            socket.onerror = () => reject(new Error('socket'));
+        });
+        socket.onerror = () => showError('Connection to the verification service was lost.');
         
-        mediaRecorder.onstop = () => {
-            const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-            processAudio(audioBlob);
-            audioChunks = [];
+        workletNode = new AudioWorkletNode(audioContext, 'pcm16-frames');
+        workletNode.port.onmessage = event => {
+            if (socket.readyState === WebSocket.OPEN) {
+                socket.send(event.data);
+            }
         };
+        audioContext.createMediaStreamSource(mediaStream).connect(workletNode);
         
-        mediaRecorder.start();
+        this.style.display = 'none';
+        document.getElementById('stop-recording').style.display = 'inline-flex';
+        document.getElementById('recording-status').style.display = 'block';
         
-        // Auto-stop after 10 seconds
-        setTimeout(() => {
-            if (mediaRecorder.state === 'recording') {
-                document.getElementById('stop-recording').click();
-            }
-        }, 10000);
+        // Safety cap; verification normally ends as soon as the phrase is heard
+        autoStop = setTimeout(() => stopStreaming(), 10000);
         
     } catch (error) {
-        console.error('Error accessing microphone:', error);
-        showError('Unable to access microphone. Please check permissions.');
+        console.error('Error starting voice capture:', error);
+        stopCapture();
+        showError(error.message === 'socket'
+            ? 'Unable to reach the verification service. Please try again.'
+            : 'Unable to access microphone. Please check permissions.');
     }
 });
 
-document.getElementById('stop-recording').addEventListener('click', function() {
-    if (mediaRecorder && mediaRecorder.state === 'recording') {
-        mediaRecorder.stop();
-        mediaRecorder.stream.getTracks().forEach(track => track.stop());
+document.getElementById('stop-recording').addEventListener('click', () => stopStreaming());
+
+function stopCapture() {
+    clearTimeout(autoStop);
+    if (workletNode) {
+        workletNode.port.onmessage = null;
+        workletNode.disconnect();
+        workletNode = null;
     }
-    
-    this.style.display = 'none';
+    if (mediaStream) {
+        mediaStream.getTracks().forEach(track => track.stop());
+        mediaStream = null;
+    }
+    if (audioContext) {
+        audioContext.close();
+        audioContext = null;
+    }
+    document.getElementById('stop-recording').style.display = 'none';
     document.getElementById('start-recording').style.display = 'inline-flex';
     document.getElementById('recording-status').style.display = 'none';
-});
+}
 
-function processAudio(audioBlob) {
+function stopStreaming() {
+    // Tell the server the recording ended; it replies with the result
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send('end');
+        showProcessing();
+    }
+    stopCapture();
+}
+
+function handleMessage(message) {
+    if (message.type === 'partial') {
+        document.getElementById('live-transcript').textContent = message.transcript;
+        document.querySelectorAll('.challenge-word').forEach((word, index) => {
+            const heard = (message.word_scores[index] || 0) >= WORD_THRESHOLD;
+            word.style.borderColor = heard ? 'var(--success)' : 'var(--border)';
+        });
+    } else if (message.type === 'result') {
+        stopCapture();
+        if (message.next_challenge) {
+            useChallenge(message.next_challenge);
+        }
+        if (message.error) {
+            showError(message.error);
+        } else {
+            showResult(message);
+        }
+    }
+}
+
+function useChallenge(challenge) {
+    challengeId = challenge.challenge_id;
+    document.querySelectorAll('.challenge-word').forEach((word, index) => {
+        word.textContent = challenge.words[index] || '';
+        word.style.borderColor = 'var(--border)';
+    });
+    document.getElementById('live-transcript').textContent = '';
+}
+
+function showProcessing() {
     document.getElementById('verification-result').innerHTML = `
         <div class="card" style="background: var(--background-alt); border: 1px solid var(--border);">
             <div class="loading" style="justify-content: center; padding: var(--space-xl);">
@@ -1674,41 +1771,43 @@ function processAudio(audioBlob) {
             </div>
         </div>
     `;
-    
-    // Simulate processing time
-    setTimeout(() => {
-        const success = Math.random() > 0.3; // 70% success rate for demo
-        
-        if (success) {
-            document.getElementById('verification-result').innerHTML = `
-                <div class="card" style="background: rgba(48, 209, 88, 0.1); border: 1px solid rgba(48, 209, 88, 0.2);">
-                    <div style="text-align: center; padding: var(--space-lg);">
-                        <div style="font-size: var(--text-4xl); color: var(--success); margin-bottom: var(--space-md);">
-                            <i class="fas fa-check-circle"></i>
-                        </div>
-                        <h4 style="color: var(--success); margin-bottom: var(--space-sm);">Voice Verified Successfully</h4>
-                        <p style="color: var(--text-secondary); font-size: var(--text-sm);">
-                            Confidence: 96.8% | Processing time: 247ms
-                        </p>
+}
+
+function showResult(result) {
+    const confidence = (result.confidence * 100).toFixed(1);
+    const retry = result.next_challenge
+        ? 'Please try again with the new phrase above.'
+        : 'Please request a new challenge and try again.';
+    const elapsed = Math.round(result.processing_time_ms);
+    if (result.verified) {
+        document.getElementById('verification-result').innerHTML = `
+            <div class="card" style="background: rgba(48, 209, 88, 0.1); border: 1px solid rgba(48, 209, 88, 0.2);">
+                <div style="text-align: center; padding: var(--space-lg);">
+                    <div style="font-size: var(--text-4xl); color: var(--success); margin-bottom: var(--space-md);">
+                        <i class="fas fa-check-circle"></i>
                     </div>
+                    <h4 style="color: var(--success); margin-bottom: var(--space-sm);">Voice Verified Successfully</h4>
+                    <p style="color: var(--text-secondary); font-size: var(--text-sm);">
+                        Confidence: ${confidence}% | Processing time: ${elapsed}ms
+                    </p>
                 </div>
-            `;
-        } else {
-            document.getElementById('verification-result').innerHTML = `
-                <div class="card" style="background: rgba(255, 69, 58, 0.1); border: 1px solid rgba(255, 69, 58, 0.2);">
-                    <div style="text-align: center; padding: var(--space-lg);">
-                        <div style="font-size: var(--text-4xl); color: var(--danger); margin-bottom: var(--space-md);">
-                            <i class="fas fa-times-circle"></i>
-                        </div>
-                        <h4 style="color: var(--danger); margin-bottom: var(--space-sm);">Verification Failed</h4>
-                        <p style="color: var(--text-secondary); font-size: var(--text-sm);">
-                            Voice does not match enrolled profile. Please try again.
-                        </p>
+            </div>
+        `;
+    } else {
+        document.getElementById('verification-result').innerHTML = `
+            <div class="card" style="background: rgba(255, 69, 58, 0.1); border: 1px solid rgba(255, 69, 58, 0.2);">
+                <div style="text-align: center; padding: var(--space-lg);">
+                    <div style="font-size: var(--text-4xl); color: var(--danger); margin-bottom: var(--space-md);">
+                        <i class="fas fa-times-circle"></i>
                     </div>
+                    <h4 style="color: var(--danger); margin-bottom: var(--space-sm);">Verification Failed</h4>
+                    <p style="color: var(--text-secondary); font-size: var(--text-sm);">
+                        The spoken phrase did not match the challenge (confidence ${confidence}%). ${retry}
+                    </p>
                 </div>
-            `;
-        }
-    }, 2000);
+            </div>
+        `;
+    }
 }
 
 function showError(message) {
@@ -1728,15 +1827,18 @@ function showError(message) {
 // Handle escape key
 document.addEventListener('keydown', (e) => {
     if (e.key === 'Escape') {
+        stopCapture();
         closeModal();
     }
 });
+</script>
 
+<style>
 @keyframes fadeOut {
     from { opacity: 1; }
     to { opacity: 0; }
 }
-</script>
+</style>
 """
 
 def setup_templates():
@@ -0,0 +1,399 @@
+"""
+PayShield Transcript Matcher
+Fuzzy, order-aware matching of a speech-to-text transcript against the
+challenge phrase
+"""
+
+import functools
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from phonetic_index import metaphone
+
+# Words the speaker adds that never count as extra tokens
+FILLERS = frozenset({"um", "umm", "uh", "uhm", "er", "erm", "ah", "hmm", "mm", "mhm"})
+
+_NUMBER_WORDS = (
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+    "fourteen fifteen sixteen seventeen eighteen nineteen"
+).split()
+_TENS = "twenty thirty forty fifty sixty seventy eighty ninety".split()
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# A spoken three- or six-word phrase never needs more tokens; this caps the
+# cost of a rambling transcript
+MAX_TOKENS = 48
+
+# Score for a token that sounds like the challenge word (same Metaphone key)
+# but is spelled differently, e.g. "night" for "knight". Challenge phrases
+# never contain two confusable words, so this can't credit the wrong word.
+PHONETIC_SCORE = 0.9
+
+# Confidence lost per transcript token not aligned to a challenge word, up
+# to MAX_EXTRA_PENALTY
+EXTRA_TOKEN_PENALTY = 0.02
+MAX_EXTRA_PENALTY = 0.2
+
+
+def _spell_number(value: int) -> List[str]:
+    """Words for 0-99 (engines often write "two" as "2")"""
+    if value < 20:
+        return [_NUMBER_WORDS[value]]
+    tens, units = divmod(value, 10)
+    return [_TENS[tens - 2]] + ([_NUMBER_WORDS[units]] if units else [])
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase ASCII with accents, apostrophes and punctuation removed
+
+    e.g. "Café, don't  STOP!" -> "cafe dont stop"
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    stripped = stripped.lower().replace("'", "").replace("’", "")
+    return _NON_WORD.sub(" ", stripped).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized words with fillers dropped and numbers below 100 spelled out"""
+    tokens = []
+    for token in normalize(text).split():
+        if token in FILLERS:
+            continue
+        if token.isdigit() and len(token) <= 2:
+            tokens.extend(_spell_number(int(token)))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+@functools.lru_cache(maxsize=65536)
+def _metaphone(word: str) -> str:
+    return metaphone(word)
+
+
+def _encode(words: Sequence[str], width: int) -> np.ndarray:
+    """Words as a (len(words), width) array of code points, zero-padded"""
+    padded = "".join(word.ljust(width, "\0") for word in words)
+    return np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32).reshape(len(words), width)
+
+
+def edit_distances(expected: Sequence[str], candidates: Sequence[str]) -> np.ndarray:
+    """
+    Levenshtein distance between every expected word and every candidate
+
+    All pairs advance through the dynamic programme together, one row (one
+    character of the expected word) per step. Within a row the insertion
+    term depends on the cell to its left; it is resolved for the whole row
+    at once as j + cumulative_min(t[l] - l), where t is the row before
+    insertions are considered. Padding never affects a pair's result,
+    because cell (i, j) only depends on the first i and j characters.
+
+    Args:
+        expected: Challenge words (k)
+        candidates: Transcript tokens (m)
+
+    Returns:
+        (k, m) int array of distances
+    """
+    k, m = len(expected), len(candidates)
+    len_a = np.fromiter(map(len, expected), dtype=np.int32, count=k)
+    len_b = np.fromiter(map(len, candidates), dtype=np.int32, count=m)
+    result = np.empty((k, m), dtype=np.int32)
+    if not k or not m:
+        return result
+
+    width_a, width_b = int(len_a.max()), int(len_b.max())
+    a = _encode(expected, width_a)
+    b = _encode(candidates, width_b)
+    # mismatch[i, x, y, j]: character i of word x differs from character j of candidate y
+    mismatch = (a.T[:, :, None, None] != b[None, None, :, :]).astype(np.int32)
+
+    columns = np.arange(width_b + 1, dtype=np.int32)
+    row = np.broadcast_to(columns, (k, m, width_b + 1)).copy()
+    before = np.empty_like(row)
+    candidate_index = np.arange(m)
+    result[len_a == 0] = len_b
+    for i in range(1, width_a + 1):
+        before[..., 0] = i
+        np.minimum(row[..., 1:] + 1, row[..., :-1] + mismatch[i - 1], out=before[..., 1:])
+        before -= columns
+        row = np.minimum.accumulate(before, axis=-1)
+        row += columns
+        finished = np.flatnonzero(len_a == i)
+        if finished.size:
+            result[finished] = row[finished][:, candidate_index, len_b]
+    return result
+
+
+def similarities(expected: Sequence[str], candidates: Sequence[str]) -> np.ndarray:
+    """
+    Per-pair score in [0, 1]: 1 - distance / longer length, raised to
+    PHONETIC_SCORE when the Metaphone keys are equal
+
+    Returns:
+        (len(expected), len(candidates)) float array
+    """
+    distances = edit_distances(expected, candidates)
+    len_a = np.fromiter(map(len, expected), dtype=np.int32, count=len(expected))
+    len_b = np.fromiter(map(len, candidates), dtype=np.int32, count=len(candidates))
+    longest = np.maximum(np.maximum(len_a[:, None], len_b[None, :]), 1)
+    scores = 1.0 - distances / longest
+
+    keys_a = [_metaphone(word) for word in expected]
+    keys_b = [_metaphone(word) for word in candidates]
+    for x, key in enumerate(keys_a):
+        if key:
+            for y, other in enumerate(keys_b):
+                if other == key and scores[x, y] < PHONETIC_SCORE:
+                    scores[x, y] = PHONETIC_SCORE
+    return scores
+
+
+@dataclass
+class MatchResult:
+    """Outcome of matching one transcript against a challenge phrase"""
+    matched: bool
+    confidence: float
+    word_scores: List[float]
+    aligned: List[Optional[str]]
+    extra_tokens: int
+
+
+class TranscriptMatcher:
+    """
+    Align a transcript with the challenge words and score each word
+
+    Alignment keeps word order: the challenge words are matched, in order,
+    to a subsequence of the transcript tokens, maximising the total score.
+    A challenge word may also match two adjacent tokens joined together
+    (engines split compounds: "sun flower"). Unmatched challenge words
+    score 0; unmatched tokens lower the confidence slightly.
+    """
+
+    def __init__(self, word_threshold: float = 0.75, min_confidence: float = 0.85):
+        """
+        Initialize the matcher
+
+        Args:
+            word_threshold: Lowest score any single challenge word may have
+            min_confidence: Lowest overall confidence that counts as a match
+        """
+        self.word_threshold = word_threshold
+        self.min_confidence = min_confidence
+
+    def _align(self, single: List[List[float]], joined: List[List[float]],
+               m: int) -> Tuple[List[float], List[Tuple[int, int]]]:
+        """Best monotone alignment; returns word scores and (token, width) per word"""
+        k = len(single)
+        total = [[0.0] * (m + 1) for _ in range(k + 1)]
+        move = [[0] * (m + 1) for _ in range(k + 1)]
+        # move: 0 word missed, 1 token skipped, 2 one token, 3 two tokens joined
+        for i in range(1, k + 1):
+            above, here = total[i - 1], total[i]
+            row_single, row_joined, moves = single[i - 1], joined[i - 1], move[i]
+            for j in range(m + 1):
+                best, step = above[j], 0
+                if j:
+                    if here[j - 1] > best:
+                        best, step = here[j - 1], 1
+                    score = above[j - 1] + row_single[j - 1]
+                    if score >= best:
+                        best, step = score, 2
+                    if j > 1:
+                        score = above[j - 2] + row_joined[j - 2]
+                        if score > best:
+                            best, step = score, 3
+                here[j], moves[j] = best, step
+
+        word_scores = [0.0] * k
+        spans: List[Tuple[int, int]] = [(-1, 0)] * k
+        i, j = k, m
+        while i > 0:
+            step = move[i][j]
+            if step == 1:
+                j -= 1
+                continue
+            if step == 2:
+                j -= 1
+                word_scores[i - 1], spans[i - 1] = single[i - 1][j], (j, 1)
+            elif step == 3:
+                j -= 2
+                word_scores[i - 1], spans[i - 1] = joined[i - 1][j], (j, 2)
+            i -= 1
+        return word_scores, spans
+
+    def match(self, expected_phrase: str, transcript: str) -> MatchResult:
+        """
+        Score a transcript against the challenge phrase
+
+        Args:
+            expected_phrase: Challenge phrase as issued
+            transcript: Speech-to-text output
+
+        Returns:
+            MatchResult with per-word scores and the overall confidence
+        """
+        return self.match_tokens(tokenize(expected_phrase), tokenize(transcript))
+
+    def match_tokens(self, expected: List[str], tokens: List[str]) -> MatchResult:
+        """Score already tokenized challenge words against transcript tokens"""
+        if not expected:
+            raise ValueError("Challenge phrase has no words")
+        tokens = tokens[:MAX_TOKENS]
+        if not tokens:
+            return MatchResult(False, 0.0, [0.0] * len(expected), [None] * len(expected), 0)
+
+        joined_tokens = [tokens[j] + tokens[j + 1] for j in range(len(tokens) - 1)]
+        scores = similarities(expected, tokens + joined_tokens)
+        m = len(tokens)
+        word_scores, spans = self._align(scores[:, :m].tolist(), scores[:, m:].tolist(), m)
+
+        aligned = [
+            "".join(tokens[start:start + width]) if width else None
+            for start, width in spans
+        ]
+        extra_tokens = m - sum(width for _, width in spans)
+        penalty = min(EXTRA_TOKEN_PENALTY * extra_tokens, MAX_EXTRA_PENALTY)
+        confidence = max(0.0, sum(word_scores) / len(word_scores) - penalty)
+        return MatchResult(
+            matched=min(word_scores) >= self.word_threshold and confidence >= self.min_confidence,
+            confidence=round(confidence, 4),
+            word_scores=[round(score, 4) for score in word_scores],
+            aligned=aligned,
+            extra_tokens=extra_tokens
+        )
+
+
+class IncrementalMatcher:
+    """
+    Running match over a streamed transcript
+
+    Final turns are kept and the current partial turn replaces the previous
+    one. The alignment is recomputed only when the tokens change, so the
+    result is current after every engine update and verification can end
+    as soon as the last challenge word is heard.
+    """
+
+    def __init__(self, expected_phrase: str, matcher: Optional[TranscriptMatcher] = None):
+        """
+        Initialize the running match
+
+        Args:
+            expected_phrase: Challenge phrase as issued
+            matcher: Thresholds to use (the global instance by default)
+        """
+        self.matcher = matcher or transcript_matcher
+        self.expected = tokenize(expected_phrase)
+        self._final: List[str] = []
+        self._partial = ""
+        self._tokens: List[str] = []
+        self.result = self.matcher.match_tokens(self.expected, [])
+
+    @property
+    def transcript(self) -> str:
+        """Everything heard so far"""
+        return " ".join(self._final + [self._partial]).strip()
+
+    def update(self, text: str, is_final: bool) -> MatchResult:
+        """
+        Apply one streaming transcript event
+
+        Args:
+            text: Transcript of the current turn so far
+            is_final: Whether the turn has ended
+
+        Returns:
+            MatchResult over everything heard so far
+        """
+        if is_final:
+            self._final.append(text)
+            self._partial = ""
+        else:
+            self._partial = text
+        tokens = tokenize(self.transcript)
+        if tokens != self._tokens:
+            self._tokens = tokens
+            self.result = self.matcher.match_tokens(self.expected, tokens)
+        return self.result
+
+
+# Global instance for the verification pipeline
+transcript_matcher = TranscriptMatcher()
+
+
+def match_transcript(expected_phrase: str, transcript: str) -> MatchResult:
+    """
+    Convenience function using the default thresholds
+
+    Args:
+        expected_phrase: Challenge phrase as issued
+        transcript: Speech-to-text output
+
+    Returns:
+        MatchResult with per-word scores and the overall confidence
+    """
+    return transcript_matcher.match(expected_phrase, transcript)
+
+
+if __name__ == "__main__":
+    # Behaviour checks and a per-comparison benchmark against a pure-Python
+    # all-pairs edit distance
+    import random
+    import time
+
+    from phonetic_index import edit_distance
+
+    cases = [
+        ("check authority cut", "Check, authority... cut!", True),
+        ("check authority cut", "um so the words are check authority cut", True),
+        ("knight river table", "night river table", True),
+        ("sunflower river table", "sun flower river table", True),
+        ("check authority cut", "check authority", False),
+        ("check authority cut", "cut authority check", False),
+        ("democratic degree gun", "democrat degrees gun", True),
+        ("democratic degree gun", "completely different words here", False),
+    ]
+    for expected, transcript, should_match in cases:
+        result = match_transcript(expected, transcript)
+        status = "✅" if result.matched == should_match else "❌"
+        print(f"{status} {transcript!r:45} matched={result.matched} confidence={result.confidence} "
+              f"scores={result.word_scores} aligned={result.aligned}")
+
+    with open("diceware.txt", encoding="utf-8") as f:
+        words = [line.strip() for line in f if line.strip()]
+    rng = random.Random(0)
+
+    def noisy(word: str) -> str:
+        if rng.random() < 0.3 and len(word) > 3:
+            p = rng.randrange(len(word))
+            return word[:p] + rng.choice("aeiou") + word[p + 1:]
+        return word
+
+    for word_count in (3, 6):
+        pairs = []
+        for _ in range(2000):
+            phrase = rng.sample(words, word_count)
+            spoken = ["so"] + [noisy(word) for word in phrase] + ["thanks"]
+            pairs.append((" ".join(phrase), " ".join(spoken)))
+
+        started = time.perf_counter()
+        for expected, transcript in pairs:
+            match_transcript(expected, transcript)
+        vectorised = (time.perf_counter() - started) / len(pairs) * 1000
+
+        started = time.perf_counter()
+        for expected, transcript in pairs:
+            tokens = tokenize(transcript)
+            candidates = tokens + [a + b for a, b in zip(tokens, tokens[1:])]
+            [[edit_distance(a, b) for b in candidates] for a in tokenize(expected)]
+        pure = (time.perf_counter() - started) / len(pairs) * 1000
+
+        print(f"{word_count} words: match_transcript {vectorised:.3f}ms per comparison "
+              f"(pure-Python distances alone {pure:.3f}ms), target < 1ms: "
+              f"{'✅' if vectorised < 1 else '❌'}")
@@ -4,32 +4,34 @@ Real-time voice verification with 300ms response time
 """
 
 import asyncio
-import json
-import logging
-import hashlib
-import uuid
 import os
-import random
 import time
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
-import numpy as np
+from typing import Optional, Dict, Any, List, AsyncIterator, Awaitable, Callable
 import assemblyai as aai
-import wave
 import io
 
 # Import the challenge generator
+from audio_executor import ExecutorBusy, run_audio_stage
+from audio_preprocessing import AudioFormatError, prepare_upload
 from challenge_generator import get_challenge
+from storage_manager import store_challenge, open_challenge, consume_challenge, storage_manager
+from structured_logging import get_logger, configure_logging
+from streaming_transcriber import AssemblyAITranscriber, StreamingTranscriber, DEFAULT_SAMPLE_RATE
+from transcript_matcher import IncrementalMatcher, MatchResult, match_transcript
 
-logging.basicConfig(level=logging.INFO)
-aai.settings.api_key = os.getenv("")
+aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
+
+# Longest a streamed answer may take; the browser also stops recording at 10s
+STREAM_TIMEOUT = float(os.getenv("VOICE_STREAM_TIMEOUT", "12"))
+# Frames buffered between the socket and the transcriber (100ms each); when
+# full, reading from the socket pauses
+STREAM_QUEUE_FRAMES = 50
 
 class VoiceProcessor:
     """Main voice processing class for PayShield verification"""
     
     def __init__(self):
-        self.logger = logging.getLogger(__name__)
+        self.logger = get_logger(__name__)
         # Remove any hardcoded challenge words - now using challenge_generator
         
     def generate_challenge(self, word_count: int = 3) -> Dict[str, Any]:
@@ -45,45 +47,370 @@ class VoiceProcessor:
         try:
             return get_challenge(word_count)
         except Exception as e:
-            self.logger.error(f"Failed to generate challenge: {e}")
+            self.logger.error("Failed to generate challenge: %s", e)
             # Fallback to ensure system doesn't break
             return {"phrase": "fallback challenge phrase"}
     
-    async def process_voice_verification(self, audio_data: bytes, expected_phrase: str) -> Dict[str, Any]:
+    async def issue_challenge(self, thread_id: str, word_count: int = 3,
+                              vendor_email: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Generate a challenge and register it for single use on a thread
+        
+        Args:
+            thread_id: Gmail thread the challenge is for
+            word_count: Number of words in challenge (3 or 6)
+            vendor_email: Vendor expected to answer, if known
+            
+        Returns:
+            Dictionary with challenge_id, phrase and expires_in seconds
+        """
+        # No fallback phrase here: an unregistered challenge can't be verified
+        challenge = get_challenge(word_count)
+        if not await store_challenge(challenge["challenge_id"], challenge["phrase"], thread_id, vendor_email):
+            raise RuntimeError("Challenge could not be registered")
+        return {**challenge, "expires_in": storage_manager.challenge_ttl}
+    
+    async def prepare_upload(self, audio_data: bytes) -> Optional[bytes]:
+        """
+        Preprocess a recorded answer for transcription
+        
+        Trims leading/trailing silence and converts to 16kHz mono PCM16 in
+        a worker process, so decoding never stalls the event loop.
+        
+        Args:
+            audio_data: Raw audio bytes
+            
+        Returns:
+            Audio to upload, or None if the recording has no speech
+            
+        Raises:
+            ExecutorBusy: The audio workers are overloaded
+        """
+        try:
+            upload, info = await run_audio_stage(prepare_upload, audio_data)
+        except AudioFormatError:
+            # Compressed recordings (webm/ogg from MediaRecorder) go as they are
+            return audio_data
+        if upload is None:
+            self.logger.info("No speech in %.2fs recording, skipping transcription", info["original_duration"])
+            return None
+        self.logger.debug("Uploading %.2fs of %.2fs recording (%s of %s bytes)", info["duration"],
+                          info["original_duration"], len(upload), len(audio_data))
+        return upload
+    
+    async def transcribe_upload(self, upload: Optional[bytes]) -> str:
+        """
+        Transcribe preprocessed audio with AssemblyAI
+        
+        Args:
+            upload: Audio from prepare_upload (None means no speech)
+            
+        Returns:
+            Transcript text (empty if nothing was recognised)
+        """
+        if upload is None:
+            return ""
+        # The SDK call blocks until the transcript is ready
+        transcript = await asyncio.to_thread(aai.Transcriber().transcribe, io.BytesIO(upload))
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+        return transcript.text or ""
+    
+    async def transcribe(self, audio_data: bytes) -> str:
+        """
+        Transcribe a recorded answer with AssemblyAI
+        
+        Args:
+            audio_data: Raw audio bytes
+            
+        Returns:
+            Transcript text (empty if nothing was recognised)
+        """
+        return await self.transcribe_upload(await self.prepare_upload(audio_data))
+    
+    async def _consume(self, challenge_id: str, expected_phrase: str,
+                       thread_id: Optional[str], vendor_email: Optional[str],
+                       start_time: float) -> Optional[Dict[str, Any]]:
+        """Consume the challenge; returns the rejection result if it can't be used"""
+        # Without an id there is nothing to consume, and the phrase could be replayed
+        if not challenge_id or not await consume_challenge(
+                challenge_id, expected_phrase, thread_id or "", vendor_email):
+            return {
+                "verified": False,
+                "error": "Challenge expired, already used or not issued for this thread",
+                "challenge_rejected": True,
+                "processing_time_ms": (time.time() - start_time) * 1000
+            }
+        return None
+    
+    def _result(self, match: MatchResult, start_time: float, **extra: Any) -> Dict[str, Any]:
+        """Verification result dictionary for a scored transcript"""
+        processing_time = (time.time() - start_time) * 1000
+        self.logger.info("Voice verification completed in %.2fms", processing_time,
+                         processing_ms=round(processing_time, 2), verified=match.matched,
+                         confidence=match.confidence)
+        return {
+            "verified": match.matched,
+            "confidence": match.confidence,
+            "word_scores": match.word_scores,
+            "matched_words": match.aligned,
+            "processing_time_ms": processing_time,
+            **extra
+        }
+    
+    async def process_voice_verification(self, audio_data: bytes, expected_phrase: str,
+                                         thread_id: Optional[str] = None,
+                                         vendor_email: Optional[str] = None,
+                                         transcript: Optional[str] = None,
+                                         *, challenge_id: str) -> Dict[str, Any]:
         """
         Process voice verification against expected phrase
         
         Args:
             audio_data: Raw audio bytes
             expected_phrase: The challenge phrase to verify against
+            thread_id: Thread the answer arrived on
+            vendor_email: Vendor answering
+            transcript: Transcript if the audio was already transcribed
+            challenge_id: Id from issue_challenge (keyword-only); the challenge
+                          is consumed before transcription, so a phrase can
+                          only be answered once
             
         Returns:
             Verification result dictionary
         """
         start_time = time.time()
         
+        # Preprocess before consuming the challenge: if the audio workers are
+        # overloaded the request is shed while the challenge is still usable
+        upload = None
+        if transcript is None:
+            try:
+                upload = await self.prepare_upload(audio_data)
+            except ExecutorBusy as e:
+                self.logger.warning("⚠️ Voice verification shed: %s", e)
+                return {
+                    "verified": False,
+                    "error": str(e),
+                    "retry": True,
+                    "processing_time_ms": (time.time() - start_time) * 1000
+                }
+            except Exception as e:
+                self.logger.error("Voice verification failed: %s", e)
+                return {
+                    "verified": False,
+                    "error": str(e),
+                    "processing_time_ms": (time.time() - start_time) * 1000
+                }
+        
+        rejected = await self._consume(challenge_id, expected_phrase, thread_id, vendor_email, start_time)
+        if rejected:
+            return rejected
+        
         try:
-            # Process audio and verify
-            # Your existing voice processing logic here
+            if transcript is None:
+                transcript = await self.transcribe_upload(upload)
             
-            processing_time = (time.time() - start_time) * 1000
-            self.logger.info(f"Voice verification completed in {processing_time:.2f}ms")
+            # Word-level alignment of the transcript with the challenge words
+            match = match_transcript(expected_phrase, transcript)
             
+            return self._result(match, start_time)
+            
+        except Exception as e:
+            self.logger.error("Voice verification failed: %s", e)
             return {
-                "verified": True,
-                "confidence": 0.95,
-                "processing_time_ms": processing_time
+                "verified": False,
+                "error": str(e),
+                "processing_time_ms": (time.time() - start_time) * 1000
             }
+
+    async def verify_stream(self, frames: AsyncIterator[bytes], expected_phrase: str,
+                            thread_id: Optional[str] = None,
+                            vendor_email: Optional[str] = None,
+                            transcriber: Optional[StreamingTranscriber] = None,
+                            on_update: Optional[Callable[[str, MatchResult], Awaitable[None]]] = None,
+                            timeout: float = STREAM_TIMEOUT,
+                            *, challenge_id: str) -> Dict[str, Any]:
+        """
+        Verify an answer while it is being spoken
+        
+        Frames go to the streaming transcriber as they arrive and every
+        transcript update is re-matched. Verification ends as soon as all
+        challenge words have been heard, without waiting for the speaker
+        to stop or the audio to end.
+        
+        Args:
+            frames: PCM16 mono audio frames, ending when the recording stops
+            expected_phrase: The challenge phrase to verify against
+            thread_id: Thread the answer arrived on
+            vendor_email: Vendor answering
+            transcriber: Streaming engine (AssemblyAI by default)
+            on_update: Awaited with the transcript so far and the running match
+            timeout: Seconds before giving up on an answer
+            challenge_id: Id from issue_challenge (keyword-only; consumed
+                          before streaming)
             
+        Returns:
+            Verification result dictionary (completed_early is True when it
+            finished before the audio ended)
+        """
+        start_time = time.time()
+        
+        rejected = await self._consume(challenge_id, expected_phrase, thread_id, vendor_email, start_time)
+        if rejected:
+            return rejected
+        
+        matcher = IncrementalMatcher(expected_phrase)
+        events = (transcriber or AssemblyAITranscriber()).stream(frames)
+        completed_early = False
+        try:
+            async with asyncio.timeout(timeout):
+                async for event in events:
+                    result = matcher.update(event.text, event.is_final)
+                    if on_update is not None:
+                        await on_update(matcher.transcript, result)
+                    if result.matched:
+                        completed_early = not event.is_final
+                        break
+        except TimeoutError:
+            self.logger.warning("⚠️ Streamed answer timed out after %ss", timeout)
         except Exception as e:
-            self.logger.error(f"Voice verification failed: {e}")
+            self.logger.error("Streaming verification failed: %s", e)
             return {
                 "verified": False,
                 "error": str(e),
                 "processing_time_ms": (time.time() - start_time) * 1000
             }
+        finally:
+            # Ends the transcription session when we stop listening early
+            await events.aclose()
+        
+        return self._result(matcher.result, start_time, completed_early=completed_early)
+    
+    async def handle_verification_socket(self, websocket, expected_phrase: str,
+                                         thread_id: Optional[str] = None,
+                                         vendor_email: Optional[str] = None,
+                                         sample_rate: int = DEFAULT_SAMPLE_RATE,
+                                         transcriber: Optional[StreamingTranscriber] = None,
+                                         *, challenge_id: str) -> None:
+        """
+        Serve one streamed answer over a WebSocket
+        
+        The client sends binary PCM16 mono frames and the text message "end"
+        when it stops recording; it receives {"type": "partial", ...} updates
+        and one {"type": "result", ...} message, then the socket is closed.
+        The challenge is used up either way, so a failed result carries
+        next_challenge ({"challenge_id", "words", "expires_in"}) for the
+        client to retry with. Routes that only have the id should mount
+        handle_challenge_socket instead.
+        
+        Args:
+            websocket: ASGI WebSocket (Starlette/FastAPI interface)
+            expected_phrase: The challenge phrase to verify against
+            thread_id: Thread the answer is for
+            vendor_email: Vendor answering
+            sample_rate: Sample rate the client records at
+            transcriber: Streaming engine (AssemblyAI by default)
+            challenge_id: Id from issue_challenge (keyword-only)
+        """
+        await websocket.accept()
+        frames_queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_FRAMES)
+        
+        async def receive() -> None:
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect" or message.get("text") == "end":
+                        break
+                    if message.get("bytes"):
+                        await frames_queue.put(message["bytes"])
+                await frames_queue.put(None)
+            except BaseException:
+                # Cancelled once verification is over (or the socket failed):
+                # nobody may be draining the queue, so end the audio without
+                # waiting on it
+                while frames_queue.full():
+                    frames_queue.get_nowait()
+                frames_queue.put_nowait(None)
+                raise
+        
+        async def frames() -> AsyncIterator[bytes]:
+            while (frame := await frames_queue.get()) is not None:
+                yield frame
+        
+        async def send_update(transcript: str, match: MatchResult) -> None:
+            await websocket.send_json({
+                "type": "partial",
+                "transcript": transcript,
+                "word_scores": match.word_scores
+            })
+        
+        receiver = asyncio.create_task(receive())
+        try:
+            result = await self.verify_stream(
+                frames(), expected_phrase, thread_id, vendor_email,
+                transcriber=transcriber or AssemblyAITranscriber(sample_rate),
+                on_update=send_update, challenge_id=challenge_id
+            )
+            if not result["verified"] and thread_id and not result.get("challenge_rejected"):
+                result["next_challenge"] = await self._reissue(expected_phrase, thread_id, vendor_email)
+            await websocket.send_json({"type": "result", **result})
+            await websocket.close()
+        except Exception as e:
+            # Usually the client went away before the result was sent
+            self.logger.warning("⚠️ Verification socket closed early: %s", e)
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+    
+    async def handle_challenge_socket(self, websocket, challenge_id: str,
+                                      sample_rate: int = DEFAULT_SAMPLE_RATE,
+                                      transcriber: Optional[StreamingTranscriber] = None) -> None:
+        """
+        Serve a streamed answer to an issued challenge, given only its id
+        
+        Mount it from the app, e.g. @app.websocket("/ws/verify/{challenge_id}").
+        The phrase, thread and vendor are recovered from the challenge store,
+        so the client never sends the phrase back.
+        
+        Args:
+            websocket: ASGI WebSocket (Starlette/FastAPI interface)
+            challenge_id: Id from issue_challenge (the URL path)
+            sample_rate: Sample rate the client records at
+            transcriber: Streaming engine (AssemblyAI by default)
+        """
+        issued = await open_challenge(challenge_id)
+        if issued is None:
+            await websocket.accept()
+            await websocket.send_json({
+                "type": "result",
+                "verified": False,
+                "error": "Challenge expired or already used, please request a new one",
+                "challenge_rejected": True
+            })
+            await websocket.close()
+            return
+        await self.handle_verification_socket(
+            websocket, issued["phrase"], issued["thread_id"], issued["vendor_email"],
+            sample_rate=sample_rate, transcriber=transcriber, challenge_id=challenge_id
+        )
+    
+    async def _reissue(self, expected_phrase: str, thread_id: str,
+                       vendor_email: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Fresh challenge like the one just used, for the client to retry with"""
+        try:
+            issued = await self.issue_challenge(thread_id, len(expected_phrase.split()), vendor_email)
+        except Exception as e:
+            self.logger.error("Failed to issue a follow-up challenge: %s", e)
+            return None
+        return {
+            "challenge_id": issued["challenge_id"],
+            "words": issued["phrase"].split(),
+            "expires_in": issued["expires_in"]
+        }
 
 if __name__ == "__main__":
+    configure_logging()
     processor = VoiceProcessor()
     
     # Test challenge generation
@@ -93,3 +420,67 @@ if __name__ == "__main__":
     # Test with 6 words
     challenge_6 = processor.generate_challenge(6)
     print(f"Generated 6-word challenge: {challenge_6}")
+    
+    # Streamed answer through the local stub: 100ms frames arriving in real
+    # time, with the speaker still talking after the phrase
+    from streaming_transcriber import StubTranscriber
+    
+    async def stream_demo() -> Dict[str, Any]:
+        async def frames() -> AsyncIterator[bytes]:
+            for _ in range(40):
+                await asyncio.sleep(0.1)
+                yield bytes(3200)
+        
+        issued = await processor.issue_challenge("demo-thread")
+        spoken = f"okay {issued['phrase']} is that right"
+        return await processor.verify_stream(
+            frames(), issued["phrase"], "demo-thread",
+            transcriber=StubTranscriber(spoken, latency=0.05), challenge_id=issued["challenge_id"]
+        )
+    
+    print(f"Streamed verification: {asyncio.run(stream_demo())}")
+    
+    # The WebSocket route only has the challenge id; a wrong answer comes
+    # back with a fresh challenge, which is then answered correctly
+    class DemoSocket:
+        def __init__(self):
+            self.frames = 0
+            self.sent: List[Dict[str, Any]] = []
+        
+        async def accept(self) -> None:
+            pass
+        
+        async def receive(self) -> Dict[str, Any]:
+            await asyncio.sleep(0.01)
+            if self.frames < 20:
+                self.frames += 1
+                return {"type": "websocket.receive", "bytes": bytes(3200)}
+            return {"type": "websocket.receive", "text": "end"}
+        
+        async def send_json(self, message: Dict[str, Any]) -> None:
+            self.sent.append(message)
+        
+        async def close(self) -> None:
+            pass
+    
+    async def socket_demo() -> None:
+        issued = await processor.issue_challenge("demo-thread")
+        socket = DemoSocket()
+        await processor.handle_challenge_socket(socket, issued["challenge_id"],
+                                                transcriber=StubTranscriber("something else entirely"))
+        failed = socket.sent[-1]
+        assert not failed["verified"] and failed["next_challenge"], failed
+        
+        retry = failed["next_challenge"]
+        socket = DemoSocket()
+        await processor.handle_challenge_socket(socket, retry["challenge_id"],
+                                                transcriber=StubTranscriber(" ".join(retry["words"])))
+        assert socket.sent[-1]["verified"], socket.sent[-1]
+        
+        # Both ids are used up now
+        socket = DemoSocket()
+        await processor.handle_challenge_socket(socket, issued["challenge_id"])
+        assert socket.sent[-1]["challenge_rejected"], socket.sent[-1]
+        print(f"Socket retry verified with follow-up challenge {retry['words']}")
+    
+    asyncio.run(socket_demo())